@@ -1,20 +1,30 @@
 # app/api/routes.py
-from fastapi import APIRouter, HTTPException
-from starlette.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
-from app.models.sensor_data import SensorData
+from app.models.sensor_data import SensorData, SENSOR_FIELDS
+from app.models.training import TrainingRequest
 from app.core.config import MONGO_URL, DATABASE_NAME, COLLECTION_NAME
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timezone
+import asyncio
+import csv
+import io
 import json
+import time
 from bson import ObjectId
-import os
-from app.lm.data_loader import load_real_data
-from app.lm.train import train_lstm_model, simulate_data
-from app.lm.predict import predict_future_efficiency
+from bson.errors import InvalidId
+from app.lm.data_loader import sensor_data_loader
+from app.lm.predict import predict_future_efficiency, predict_future_efficiency_batch, predict_until_threshold
 from app.lm.projection import get_efficiency_projection_data
 import logging
-from app.lm.load_mode import load_trained_model
+from app.lm.registry import model_registry, current_version, MODELS_DIR
+from app.lm.jobs import training_jobs
+from app.lm.projection_cache import projection_cache
+from app.mqtt.rollups import ROLLUP_COLLECTIONS, format_rollup
+from app.core.metrics import metrics
 
 router = APIRouter()
 logging.basicConfig(level=logging.INFO)
@@ -25,19 +35,46 @@ client = AsyncIOMotorClient(MONGO_URL)
 db = client[DATABASE_NAME]
 collection = db[COLLECTION_NAME]
 
-# Custom JSON encoder to handle ObjectId
+# Custom JSON encoder to handle ObjectId and dates
 class MongoJSONEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, ObjectId):
             return str(obj)
+        if isinstance(obj, datetime):
+            return obj.isoformat()
         return super().default(obj)
 
+# Computed projections (cache misses), data loading included
+PROJECTION_SECONDS = metrics.histogram("projection_seconds", "Time to compute a projection", ["kind"])
+
+# Columns written by the CSV export when no field projection is given
+EXPORT_DEFAULT_FIELDS = ["device_id", "source"] + SENSOR_FIELDS + ["filter_operating_hours", "eficiencia"]
+
+# Upper bound of the export batch_size, rows held in memory per batch
+EXPORT_MAX_BATCH_SIZE = 10000
+
+# Upper bound of the rollup page size
+ROLLUP_MAX_LIMIT = 10000
+
+# Upper bound of future_steps; every step is one model call over the whole batch
+MAX_FUTURE_STEPS = 5000
+
 @router.post("/data/")
 async def insert_data(sensor_data: SensorData):
     """
     Insert new sensor data into the database
     """
-    result = await collection.insert_one(sensor_data.dict())
+    from app.mqtt.subscriber import live_stats
+    document = sensor_data.dict()
+    # Naive UTC like the ingest path; MongoDB stores the same instant either way
+    if document["timestamp"].tzinfo is not None:
+        document["timestamp"] = document["timestamp"].astimezone(timezone.utc).replace(tzinfo=None)
+    result = await collection.insert_one(document)
+    live_stats.record([document])
+    # Same bookkeeping as an ingest flush: the reading has no device_id, so it
+    # moves the fleet-wide watermark and evicts the fleet-wide projections
+    await projection_cache.on_flush([document])
+    await sensor_data_loader.on_flush([document])
     return {"id": str(result.inserted_id), "message": "Data inserted successfully"}
 
 @router.get("/data/")
@@ -77,11 +114,169 @@ async def get_data_by_source(source: str, limit: int = 100):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.get("/data/rollup")
+async def get_rollup(
+    resolution: str = "hour",
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    device_id: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=ROLLUP_MAX_LIMIT),
+):
+    """
+    Get pre-aggregated minute/hour/day rollups (count, min, max, mean, last per field),
+    ordered by (bucket, device_id).
+    
+    Returns {"data": [...], "next": cursor}; next is None once the range is
+    exhausted, otherwise pass it back as after=<cursor> for the following page.
+    """
+    if resolution not in ROLLUP_COLLECTIONS:
+        raise HTTPException(status_code=400, detail=f"Resolution must be one of {list(ROLLUP_COLLECTIONS)}")
+    
+    conditions = []
+    if device_id is not None:
+        conditions.append({"device_id": device_id})
+    if from_ is not None:
+        conditions.append({"bucket": {"$gte": from_}})
+    if to is not None:
+        conditions.append({"bucket": {"$lte": to}})
+    if after is not None:
+        after_bucket, after_device = _parse_rollup_after(after)
+        # null device IDs sort first; $gt does not compare across types
+        next_device = {"$ne": None} if after_device is None else {"$gt": after_device}
+        conditions.append({"$or": [
+            {"bucket": {"$gt": after_bucket}},
+            {"bucket": after_bucket, "device_id": next_device},
+        ]})
+    query = {"$and": conditions} if conditions else {}
+    
+    try:
+        # One extra row tells whether there is a next page
+        cursor = db[ROLLUP_COLLECTIONS[resolution]].find(query, {"_id": 0}) \
+            .sort([("bucket", 1), ("device_id", 1)]).limit(limit + 1)
+        docs = [doc async for doc in cursor]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = f"{last['bucket'].isoformat()},{last.get('device_id') or ''}"
+    return {"data": [format_rollup(doc) for doc in docs], "next": next_cursor}
+
+def _parse_rollup_after(after: str):
+    """
+    Parse a rollup cursor "<bucket>,<device_id>"; an empty device_id is null
+    """
+    try:
+        bucket, device_id = after.split(",", 1)
+        return datetime.fromisoformat(bucket), device_id or None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="after must be '<bucket>,<device_id>'")
+
+def _parse_after(after: str):
+    """
+    Parse a keyset cursor "<timestamp>,<_id>" taken from the last exported row
+    """
+    try:
+        timestamp, oid = after.rsplit(",", 1)
+        return datetime.fromisoformat(timestamp), ObjectId(oid)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="after must be '<timestamp>,<_id>' of the last row received")
+
+async def _export_rows(cursor, export_format: str, fields: List[str], batch_size: int):
+    """
+    Serialize the cursor batch by batch so memory stays bounded by the batch size
+    """
+    columns = ["_id", "timestamp"] + fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(columns)
+    
+    rows = 0
+    async for doc in cursor:
+        if export_format == "csv":
+            row = [doc.get(c, "") for c in columns]
+            writer.writerow([v.isoformat() if isinstance(v, datetime) else v for v in row])
+        else:
+            buffer.write(json.dumps(doc, cls=MongoJSONEncoder, separators=(",", ":")))
+            buffer.write("\n")
+        
+        rows += 1
+        if rows % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@router.get("/data/export")
+async def export_data(
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    device_id: Optional[str] = None,
+    source: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "ndjson",
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    batch_size: int = Query(1000, ge=1, le=EXPORT_MAX_BATCH_SIZE, description="Rows fetched and flushed per batch"),
+):
+    """
+    Stream sensor history as NDJSON or CSV, ordered by (timestamp, _id).
+    
+    fields is a comma separated projection; _id and timestamp are always included.
+    To page through the history, pass the timestamp and _id of the last row
+    received as after=<timestamp>,<_id>.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    
+    conditions = []
+    if device_id is not None:
+        conditions.append({"device_id": device_id})
+    if source is not None:
+        conditions.append({"source": source})
+    if from_ is not None:
+        conditions.append({"timestamp": {"$gte": from_}})
+    if to is not None:
+        conditions.append({"timestamp": {"$lte": to}})
+    if after is not None:
+        after_ts, after_id = _parse_after(after)
+        conditions.append({"$or": [
+            {"timestamp": {"$gt": after_ts}},
+            {"timestamp": after_ts, "_id": {"$gt": after_id}},
+        ]})
+    query = {"$and": conditions} if conditions else {}
+    
+    field_list = [f for f in fields.split(",") if f and f not in ("_id", "timestamp")] if fields else None
+    projection = {f: 1 for f in ["_id", "timestamp"] + field_list} if field_list else None
+    
+    cursor = collection.find(query, projection).sort([("timestamp", 1), ("_id", 1)]).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(cursor, format, field_list or EXPORT_DEFAULT_FIELDS, batch_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=sensor_data.{format}"},
+    )
+
 @router.get("/data/stats")
 async def get_stats():
     """
     Get statistics about the sensor data
     """
+    # Served from the counters kept by the ingest path; the queries below are
+    # only used when they could not be seeded at startup
+    from app.mqtt.subscriber import live_stats
+    if live_stats.seeded:
+        return live_stats.snapshot()
+    
     try:
         # Count total records
         total_count = await collection.count_documents({})
@@ -103,35 +298,221 @@ async def get_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     
-@router.get("/efficiency/projection")
-def get_efficiency_projection():
+@router.get("/ingest/stats")
+async def get_ingest_stats():
+    """
+    Get queue depth and flush latency of the batched MQTT ingest writer
+    """
+    from app.mqtt.subscriber import ingest_writer
+    return ingest_writer.get_stats()
 
-    df_real = load_real_data()
-    
-    df = simulate_data()
-    
-    print(os.path.dirname(__file__))
-    logger.info(os.path.dirname(__file__))
-    
-    if not os.path.exists("/backend/app/lm/models/lstm_model.h5"):
-        print("🔁 Entrenando modelo LSTM...")
-        model, scaler_X, scaler_y, features_columns = train_lstm_model(df)
+@router.get("/filters/rul")
+async def get_fleet_rul():
+    """
+    Remaining useful life of every filter from the online decay fit, shortest first
+    """
+    from app.mqtt.subscriber import filter_states
+    filters = [
+        {"device_id": state.device_id, "operating_hours": state.operating_hours, **state.rul}
+        for state in filter_states.states.values() if state.rul is not None
+    ]
+    filters.sort(key=lambda f: (f["vida_util_restante"] is None, f["vida_util_restante"] or 0))
+    return filters
+
+def _project(bundle, df_real, future_steps, threshold, adaptive=False, margin=0, max_hours=20000):
+    """
+    Model part of the projection; blocking, run in the threadpool
+    """
+    column_list = list(bundle.features_columns) + ['eficiencia']
+    df_real = df_real[column_list]
+
+    if adaptive:
+        # Stops at the threshold crossing (plus margin) instead of a fixed horizon
+        eficiencia_real, horas_futuras = predict_until_threshold(
+            bundle.model, df_real, bundle.scaler_X, bundle.scaler_y, bundle.features_columns,
+            threshold=threshold, max_steps=max_hours, margin=margin
+        )
     else:
-        print("✅ Cargando modelo ya entrenado...")
-        model, scaler_X, scaler_y, features_columns = load_trained_model(path="app/lm/models")
-        
-        
+        eficiencia_real, horas_futuras = predict_future_efficiency(
+            bundle.model, df_real, bundle.scaler_X, bundle.scaler_y, bundle.features_columns,
+            future_steps=future_steps
+        )
+
+    result = get_efficiency_projection_data(
+        df_real, eficiencia_real, horas_futuras, "Predicción Eficiencia del Filtro", threshold=threshold
+    )
+    result["model_version"] = bundle.version
+    return result
 
+async def _compute_projection(bundle, device_id, future_steps, threshold, adaptive=False, margin=0, max_hours=20000):
+    start = time.perf_counter()
+    # Only readings newer than the previous call are fetched from MongoDB
+    df_real = await sensor_data_loader.load(device_id=device_id)
     if df_real.empty:
+        return None
+    result = await run_in_threadpool(
+        _project, bundle, df_real, future_steps, threshold, adaptive=adaptive, margin=margin, max_hours=max_hours
+    )
+    PROJECTION_SECONDS.labels("adaptive" if adaptive else "fixed").observe(time.perf_counter() - start)
+    return result
+
+def _no_model_response():
+    if model_registry.backend == "numpy":
+        # Hosts serving the NumPy export run without TensorFlow, so they cannot train one
+        return JSONResponse(
+            status_code=503,
+            content={"message": "No model available: the numpy backend only serves an exported "
+                                "lstm_model.npz, train and promote a model on a TensorFlow host"},
+        )
+
+    # Training never runs in the request: start a background job and let the client retry
+    job = training_jobs.active_job()
+    if job is None:
+        print("🔁 Entrenando modelo LSTM...")
+        job = training_jobs.submit()
+    return JSONResponse(
+        status_code=503,
+        content={"message": "No model available, training in progress", "job": job.id},
+        headers={"Retry-After": "30"},
+    )
+
+@router.get("/efficiency/projection")
+async def get_efficiency_projection(
+    device_id: Optional[str] = None,
+    future_steps: int = Query(500, ge=1, le=MAX_FUTURE_STEPS, description="Hours projected in fixed mode"),
+    threshold: float = 70,
+    adaptive: bool = Query(False, description="Variable step projection that stops at the threshold crossing"),
+    margin: int = Query(0, ge=0, description="Hours projected past the crossing in adaptive mode"),
+    max_hours: int = Query(20000, ge=1, description="Horizon of the adaptive mode when the threshold is never crossed"),
+):
+    
+    # Model, scalers and feature columns stay loaded between requests
+    bundle = model_registry.get()
+    if bundle is None:
+        return _no_model_response()
+
+    # Identical requests are answered from cache until the device gets new data
+    options = {"future_steps": future_steps, "threshold": threshold}
+    if adaptive:
+        # margin and max_hours only change the result in adaptive mode
+        options.update(adaptive=True, margin=margin, max_hours=max_hours)
+    key = projection_cache.key(device_id, bundle.version, *sorted(options.items()))
+    result = await projection_cache.get_or_compute(
+        key, lambda: _compute_projection(bundle, device_id, **options)
+    )
+    
+    if result is None:
         return JSONResponse(status_code=404, content={"message": "No real data found"})
+    return result
 
-    df_real = df_real.drop(columns=['_id', 'timestamp'], errors='ignore')
-    column_list = list(features_columns) + ['eficiencia']
-    df_real = df_real[column_list]
+def _project_fleet(bundle, frames, future_steps, threshold, include_curves):
+    """
+    One batched rollout for every device; blocking, run in the threadpool
+    """
+    column_list = list(bundle.features_columns) + ['eficiencia']
+    df_cases = {device_id: df[column_list] for device_id, df in frames.items()}
 
-    eficiencia_real, horas_futuras = predict_future_efficiency(
-        model, df_real, scaler_X, scaler_y, features_columns, df
+    projections = predict_future_efficiency_batch(
+        bundle.model, df_cases, bundle.scaler_X, bundle.scaler_y, bundle.features_columns,
+        future_steps=future_steps
     )
 
-    result = get_efficiency_projection_data(df_real, eficiencia_real, horas_futuras, "Predicción Eficiencia del Filtro")
-    return result
\ No newline at end of file
+    results = []
+    for device_id, (eficiencia_real, horas_futuras) in projections.items():
+        result = get_efficiency_projection_data(
+            df_cases[device_id], eficiencia_real, horas_futuras, device_id,
+            threshold=threshold, include_curves=include_curves
+        )
+        result["device_id"] = device_id
+        results.append(result)
+
+    # Shortest remaining useful life first; filters not reaching the threshold last
+    results.sort(key=lambda r: (r.get("vida_util_restante") is None, r.get("vida_util_restante") or 0))
+    return results
+
+@router.get("/efficiency/projection/batch")
+async def get_fleet_projection(
+    device_ids: Optional[str] = Query(None, description="Comma separated device IDs, all devices when omitted"),
+    future_steps: int = Query(500, ge=1, le=MAX_FUTURE_STEPS, description="Hours projected per device"),
+    threshold: float = 70,
+    curves: bool = Query(False, description="Include historico/proyeccion point lists"),
+):
+    """
+    Projection of many filters in a single batched model call, ranked by remaining useful life
+    """
+    bundle = model_registry.get()
+    if bundle is None:
+        return _no_model_response()
+
+    if device_ids:
+        devices = [d.strip() for d in device_ids.split(",") if d.strip()]
+    else:
+        devices = [d for d in await collection.distinct("device_id") if d is not None]
+
+    start = time.perf_counter()
+    frames = await asyncio.gather(*(sensor_data_loader.load(device_id=d) for d in devices))
+    frames = {device_id: df for device_id, df in zip(devices, frames) if not df.empty}
+    if not frames:
+        return JSONResponse(status_code=404, content={"message": "No real data found"})
+
+    results = await run_in_threadpool(_project_fleet, bundle, frames, future_steps, threshold, curves)
+    PROJECTION_SECONDS.labels("fleet").observe(time.perf_counter() - start)
+    projected = {r["device_id"] for r in results}
+    return {
+        "model_version": bundle.version,
+        "umbral_critico": threshold,
+        "devices": results,
+        # Not enough readings for one input window
+        "skipped": [d for d in devices if d not in projected],
+    }
+
+@router.get("/efficiency/projection/cache")
+async def get_projection_cache_stats():
+    """
+    Hit/miss counters of the projection cache and rows held by the data loader
+    """
+    stats = projection_cache.get_stats()
+    stats["loader"] = sensor_data_loader.get_stats()
+    return stats
+
+@router.post("/models/train", status_code=202)
+async def submit_training(request: TrainingRequest):
+    """
+    Queue a training job; it runs in a separate process and does not slow down the API
+    """
+    job = training_jobs.submit(request.source, request.epochs, request.promote)
+    return training_jobs.get(job.id)
+
+@router.get("/models/jobs")
+async def list_training_jobs():
+    return training_jobs.list()
+
+@router.get("/models/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """
+    Status and per-epoch progress of a training job
+    """
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
+
+@router.get("/models/versions")
+async def list_model_versions():
+    bundle = model_registry.get()
+    return {
+        "current": current_version(MODELS_DIR),
+        "serving": bundle.version if bundle else None,
+        "versions": training_jobs.list_versions(),
+    }
+
+@router.post("/models/versions/{version}/promote")
+async def promote_model_version(version: str):
+    """
+    Serve an already trained version, e.g. to roll back
+    """
+    try:
+        await training_jobs.promote(version)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Model version not found")
+    return {"current": version, "serving": model_registry.get().version}
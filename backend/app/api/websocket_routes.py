@@ -1,5 +1,6 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.websockets.manager import manager
+import json
 import logging
 
 # Configure logging
@@ -8,10 +9,39 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def handle_client_message(websocket: WebSocket, message: dict):
+    """
+    Subscription protocol spoken over /ws:
+    
+        {"action": "subscribe", "devices": ["filtro-1"], "fields": ["eficiencia"], "max_rate": 1}
+        {"action": "unsubscribe", "devices": ["filtro-1"]}
+    
+    devices omitted or ["*"] means every device; "interval" (seconds between
+    updates) can be given instead of "max_rate" (updates per second), and
+    "encoding": "msgpack" switches to compact binary frames (see app/core/codec.py).
+    Clients that never subscribe keep receiving every message.
+    """
+    action = message.get("action")
+    if action == "subscribe":
+        return manager.subscribe(
+            websocket,
+            devices=message.get("devices"),
+            fields=message.get("fields"),
+            max_rate=message.get("max_rate"),
+            interval=message.get("interval"),
+            encoding=message.get("encoding"),
+        )
+    if action == "unsubscribe":
+        return manager.unsubscribe(websocket, devices=message.get("devices"))
+    if action == "ping":
+        return {"type": "pong"}
+    return {"type": "error", "message": f"Unknown action {action!r}"}
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     logger.info("WebSocket connection attempt received")
-    await manager.connect(websocket)
+    # /ws?encoding=msgpack negotiates compact binary frames from the start
+    await manager.connect(websocket, encoding=websocket.query_params.get("encoding", "json"))
     logger.info("WebSocket connection established")
     
     try:
@@ -20,15 +50,15 @@ async def websocket_endpoint(websocket: WebSocket):
             data = await websocket.receive_text()
             logger.info(f"Received message: {data}")
             
-            # You could add custom handling for client messages here
-            # For example:
-            # try:
-            #     json_data = json.loads(data)
-            #     if "command" in json_data:
-            #         # Handle commands from client
-            #         pass
-            # except Exception as e:
-            #     logger.error(f"Error processing message: {e}")
+            try:
+                json_data = json.loads(data)
+                reply = handle_client_message(websocket, json_data)
+            except Exception as e:
+                logger.error(f"Error processing message: {e}")
+                reply = {"type": "error", "message": str(e)}
+            
+            if reply is not None:
+                manager.send_to(websocket, reply)
             
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
@@ -0,0 +1,396 @@
+"""
+Bulk import of historical readings into sensor_data.
+
+Reads CSV or NDJSON files (dataset_30dias_8horas.csv, exports of
+/api/data/export, dumps of readings buffered on devices) in chunks of
+--chunk-rows rows and, per chunk and without a Python loop per row:
+
+- renames columns to the live schema (in_turbidez -> in_turbidity, ...) and
+  drops the ones the live schema does not have
+- parses timestamps; files without them (the dataset CSV) get
+  --start + filter_operating_hour
+- keeps the file's filter_operating_hours, or computes them from the
+  installation time of each filter (filters collection, or the first
+  backfilled reading of a new device) when the column or a value is missing;
+  such rows dated before the installation are skipped and counted
+- keeps the file's eficiencia, or computes it with the efficiency model of
+  the live path (app/mqtt/efficiency.py, same per-device noise streams) when
+  the column is missing or --recompute-efficiency is given
+
+Documents are written with unordered insert_many by --writers concurrent
+writers while the next chunk is parsed, and the rollup collections are
+updated from every written batch like the live ingest path does. Progress is
+checkpointed per file (rows written, in --checkpoint), so an interrupted run
+picks up where it stopped; only batches that were in flight when it stopped
+can be written twice.
+
+The API caches filter states and loaded history in memory: restart it after a
+backfill so new filters and older readings are picked up.
+
+Usage (from backend/):
+    python -m app.core.backfill ../dataset_30dias_8horas.csv --device-id filtro-1 --start 2024-01-01
+    python -m app.core.backfill dumps/*.ndjson --writers 8 --batch-size 5000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import MONGO_URL, DATABASE_NAME, COLLECTION_NAME, FILTERS_COLLECTION_NAME, EFFICIENCY_SEED
+from app.models.sensor_data import SENSOR_FIELDS
+from app.mqtt.efficiency import EfficiencyNoiseRegistry, calculate_efficiency_batch, device_noise_batch
+from app.mqtt.filter_state import DEFAULT_DEVICE_ID
+from app.mqtt.rollups import RollupWriter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Historical column names -> live schema
+COLUMN_MAP = {
+    "in_turbidez": "in_turbidity",
+    "out_turbidez": "out_turbidity",
+    "in_conductividad": "in_conductivity",
+    "out_conductividad": "out_conductivity",
+    "filter_operating_hour": "filter_operating_hours",
+}
+# Everything else in the files is dropped
+DOCUMENT_FIELDS = ["device_id", "timestamp", "source"] + SENSOR_FIELDS + ["filter_operating_hours", "eficiencia"]
+
+def _skip_lines(f, count):
+    for _ in itertools.islice(f, count):
+        pass
+
+
+def read_chunks(path, chunk_rows, skip_rows=0):
+    """
+    (first row number, DataFrame) chunks of a CSV or NDJSON file, starting at row skip_rows.
+    """
+    row = skip_rows
+    if path.endswith((".ndjson", ".jsonl")):
+        with open(path) as f:
+            _skip_lines(f, skip_rows)
+            for chunk in pd.read_json(f, lines=True, chunksize=chunk_rows, convert_dates=False):
+                yield row, chunk
+                row += len(chunk)
+        return
+
+    reader = pd.read_csv(path, chunksize=chunk_rows, skiprows=range(1, skip_rows + 1) if skip_rows else None)
+    for chunk in reader:
+        yield row, chunk
+        row += len(chunk)
+
+
+def normalize_chunk(df, default_device_id, start):
+    """
+    Live schema columns, typed, with parsed timestamps; rows without readings are dropped.
+    """
+    df = df.rename(columns=COLUMN_MAP)
+    if "device_id" not in df:
+        df["device_id"] = default_device_id
+    df["device_id"] = df["device_id"].fillna(default_device_id).astype(str)
+
+    if "timestamp" in df:
+        timestamps = pd.to_datetime(df["timestamp"], utc=True, errors="coerce", format="ISO8601")
+        # Stored like the live path: naive UTC
+        df["timestamp"] = timestamps.dt.tz_localize(None)
+    elif "filter_operating_hours" in df and start is not None:
+        df["timestamp"] = start + pd.to_timedelta(df["filter_operating_hours"].astype(np.float64), unit="h")
+    else:
+        raise ValueError("Rows have no timestamp column; pass --start to date them from filter_operating_hour")
+
+    for field in SENSOR_FIELDS + ["filter_operating_hours", "eficiencia"]:
+        if field in df:
+            df[field] = pd.to_numeric(df[field], errors="coerce")
+
+    df = df[[field for field in DOCUMENT_FIELDS if field in df]]
+    return df.dropna(subset=["timestamp", "in_ph", "out_ph"])
+
+
+def to_documents(df):
+    """
+    Records without NaN fields; timestamps become datetimes.
+    """
+    columns = list(df.columns)
+    values = [
+        list(np.asarray(df[column].dt.to_pydatetime(), dtype=object)) if column == "timestamp" else df[column].tolist()
+        for column in columns
+    ]
+    documents = [dict(zip(columns, row)) for row in zip(*values)]
+    for i in np.flatnonzero(df.isna().any(axis=1).to_numpy()):
+        documents[i] = {k: v for k, v in documents[i].items() if v is not None and v == v}
+    return documents
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+class Checkpoint:
+    """
+    Rows of each file already written. Batches finish out of order, so the
+    file offset only advances over a contiguous prefix; finished batches
+    past it are remembered as row ranges and skipped on resume.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.files = json.load(f)
+
+    def _entry(self, source):
+        return self.files.setdefault(os.path.abspath(source), {"rows": 0, "done": [], "inserted": 0, "failed": 0})
+
+    def offset(self, source):
+        return self._entry(source)["rows"]
+
+    def done_ranges(self, source):
+        return [tuple(r) for r in self._entry(source)["done"]]
+
+    def mark_done(self, source, first, last, inserted, failed):
+        entry = self._entry(source)
+        entry["inserted"] += inserted
+        entry["failed"] += failed
+        done = sorted(entry["done"] + [[first, last]])
+        while done and done[0][0] <= entry["rows"]:
+            entry["rows"] = max(entry["rows"], done.pop(0)[1])
+        entry["done"] = done
+        self.save()
+
+    def finish(self, source, total_rows):
+        entry = self._entry(source)
+        if entry["rows"] >= total_rows:
+            entry["completed_at"] = datetime.utcnow().isoformat()
+        self.save()
+
+    def completed(self, source):
+        return "completed_at" in self._entry(source)
+
+    def save(self):
+        if self.path:
+            _write_json(self.path, self.files)
+
+
+class Backfill:
+    def __init__(self, db, writers=4, batch_size=5000, chunk_rows=50000, default_device_id=DEFAULT_DEVICE_ID,
+                 start=None, recompute_efficiency=False, rollups=True, checkpoint=None, seed=EFFICIENCY_SEED):
+        self.collection = db[COLLECTION_NAME]
+        self.filters = db[FILTERS_COLLECTION_NAME]
+        self.rollups = RollupWriter(db) if rollups else None
+        self.writers = writers
+        self.batch_size = batch_size
+        self.chunk_rows = chunk_rows
+        self.default_device_id = default_device_id
+        self.start = start
+        self.recompute_efficiency = recompute_efficiency
+        self.checkpoint = checkpoint or Checkpoint(None)
+        # Per-device noise streams, seeded like the live ones
+        self.noise = EfficiencyNoiseRegistry(seed)
+        self.installed_at = {}
+        self.inserted = 0
+        self.failed = 0
+        self.rows = 0
+        self.before_install = 0
+
+    async def load_filters(self):
+        async for doc in self.filters.find({}, {"installed_at": 1}):
+            installed_at = doc.get("installed_at")
+            if isinstance(installed_at, str):
+                installed_at = datetime.fromisoformat(installed_at)
+            self.installed_at[doc["_id"]] = installed_at
+
+    async def _register_new_devices(self, df):
+        first_seen = df.groupby("device_id", sort=False)["timestamp"].min()
+        new = {device_id: ts.to_pydatetime() for device_id, ts in first_seen.items()
+               if device_id not in self.installed_at}
+        if not new:
+            return
+        # Installed at their first reading, the way the subscriber registers unknown devices
+        await self.filters.bulk_write([
+            UpdateOne({"_id": device_id}, {"$setOnInsert": {"installed_at": installed_at,
+                                                            "operating_hours": 0.0}}, upsert=True)
+            for device_id, installed_at in new.items()
+        ], ordered=False)
+        self.installed_at.update(new)
+        logger.info(f"Registered {len(new)} new filters")
+
+    def _derive(self, df):
+        if "filter_operating_hours" in df:
+            derive = df["filter_operating_hours"].isna().to_numpy()
+        else:
+            derive = np.ones(len(df), dtype=bool)
+        if derive.any():
+            rows = df[derive]
+            installed_at = pd.to_datetime(rows["device_id"].map(self.installed_at))
+            hours = ((rows["timestamp"] - installed_at).dt.total_seconds() / 3600).to_numpy()
+            df.loc[derive, "filter_operating_hours"] = np.round(hours, 2)
+
+            # No operating hours before the filter was installed: skipped, not clamped to 0
+            before = np.zeros(len(df), dtype=bool)
+            before[derive] = hours < 0
+            if before.any():
+                self.before_install += int(before.sum())
+                logger.warning(f"Skipping {int(before.sum())} readings dated before their filter's installation")
+                df = df[~before]
+
+        if self.recompute_efficiency or "eficiencia" not in df:
+            missing = np.ones(len(df), dtype=bool)
+        else:
+            missing = df["eficiencia"].isna().to_numpy()
+        if missing.any():
+            rows = df[missing]
+            df.loc[missing, "eficiencia"] = calculate_efficiency_batch(
+                rows["filter_operating_hours"].to_numpy(), rows, device_noise_batch(rows["device_id"], self.noise))
+        return df
+
+    async def _writer(self, queue):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            source, first, last, frame, documents = item
+            inserted = 0
+            if documents:
+                try:
+                    await self.collection.insert_many(documents, ordered=False)
+                    inserted = len(documents)
+                except BulkWriteError as e:
+                    inserted = e.details.get("nInserted", 0)
+                    # Rollups only count the rows that were written; documents are the frame's rows in order
+                    failed = [write_error["index"] for write_error in e.details.get("writeErrors", [])]
+                    frame = frame.drop(frame.index[failed])
+                    logger.error(f"Batch {source}:{first}-{last} partially failed "
+                                 f"({len(documents) - inserted}/{len(documents)} documents): "
+                                 f"{e.details.get('writeErrors', [])[:1]}")
+                except Exception as e:
+                    # Not checkpointed: the batch is retried by the next run
+                    logger.error(f"Batch {source}:{first}-{last} failed: {e}")
+                    self.failed += len(documents)
+                    continue
+                if self.rollups is not None and inserted:
+                    await self.rollups.on_frame(frame)
+            self.inserted += inserted
+            self.failed += len(documents) - inserted
+            self.checkpoint.mark_done(source, first, last, inserted, len(documents) - inserted)
+
+    def _prepare(self, chunk, first, skip):
+        """
+        CPU part of a chunk, run in a thread: parse, normalize and drop rows already written.
+        """
+        rows = np.arange(first, first + len(chunk))
+        keep = np.ones(len(chunk), dtype=bool)
+        for lo, hi in skip:
+            keep &= (rows < lo) | (rows >= hi)
+        chunk = chunk.set_axis(rows)[keep]
+        return normalize_chunk(chunk, self.default_device_id, self.start)
+
+    async def import_file(self, source):
+        if self.checkpoint.completed(source):
+            logger.info(f"{source} already imported, skipping")
+            return
+
+        offset = self.checkpoint.offset(source)
+        skip = self.checkpoint.done_ranges(source)
+        if offset:
+            logger.info(f"Resuming {source} at row {offset}")
+
+        queue = asyncio.Queue(maxsize=2 * self.writers)
+        writers = [asyncio.create_task(self._writer(queue)) for _ in range(self.writers)]
+        chunks = read_chunks(source, self.chunk_rows, offset)
+        total_rows = offset
+        started = time.perf_counter()
+        try:
+            while True:
+                item = await asyncio.to_thread(next, chunks, None)
+                if item is None:
+                    break
+                first, chunk = item
+                last = first + len(chunk)
+                total_rows = last
+
+                df = await asyncio.to_thread(self._prepare, chunk, first, skip)
+                await self._register_new_devices(df)
+                df = await asyncio.to_thread(self._derive, df)
+
+                # Batches are row ranges of the file, so the checkpoint does not depend on dropped rows
+                positions = df.index.to_numpy()
+                for lo in range(first, last, self.batch_size):
+                    hi = min(lo + self.batch_size, last)
+                    if any(a <= lo and hi <= b for a, b in skip):
+                        continue
+                    batch = df[(positions >= lo) & (positions < hi)]
+                    await queue.put((source, lo, hi, batch, to_documents(batch)))
+
+                self.rows += len(chunk)
+                elapsed = time.perf_counter() - started
+                logger.info(f"{source}: {last} rows read, {self.inserted} documents written "
+                            f"({(last - offset) / elapsed:.0f} rows/s)")
+        finally:
+            for _ in writers:
+                await queue.put(None)
+            await asyncio.gather(*writers)
+        self.checkpoint.finish(source, total_rows)
+
+
+async def backfill(files, mongo_url=MONGO_URL, checkpoint_path="backfill_checkpoint.json", **options):
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[DATABASE_NAME]
+    job = Backfill(db, checkpoint=Checkpoint(checkpoint_path), **options)
+    started = time.perf_counter()
+    try:
+        await job.load_filters()
+        for source in files:
+            await job.import_file(source)
+    finally:
+        client.close()
+    logger.info(f"Backfill done: {job.inserted} documents written, {job.failed} failed, "
+                f"{job.before_install} dated before installation skipped, "
+                f"{job.rows} rows read in {time.perf_counter() - started:.1f}s")
+    return job
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="CSV or NDJSON (.ndjson/.jsonl) files")
+    parser.add_argument("--device-id", default=DEFAULT_DEVICE_ID, help="device of rows without a device_id column")
+    parser.add_argument("--start", type=datetime.fromisoformat,
+                        help="timestamp of operating hour 0 for files without timestamps")
+    parser.add_argument("--recompute-efficiency", action="store_true",
+                        help="compute eficiencia even when the file has it")
+    parser.add_argument("--no-rollups", action="store_true", help="do not update the rollup collections")
+    parser.add_argument("--writers", type=int, default=4, help="concurrent insert_many calls")
+    parser.add_argument("--batch-size", type=int, default=5000, help="documents per insert_many")
+    parser.add_argument("--chunk-rows", type=int, default=50000, help="rows parsed at a time")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json",
+                        help="progress file used to resume; an empty string disables it")
+    parser.add_argument("--seed", type=int, default=EFFICIENCY_SEED, help="seed of the efficiency noise")
+    parser.add_argument("--mongo-url", default=MONGO_URL)
+    args = parser.parse_args()
+
+    asyncio.run(backfill(
+        args.files,
+        mongo_url=args.mongo_url,
+        checkpoint_path=args.checkpoint or None,
+        writers=args.writers,
+        batch_size=args.batch_size,
+        chunk_rows=args.chunk_rows,
+        default_device_id=args.device_id,
+        start=args.start,
+        recompute_efficiency=args.recompute_efficiency,
+        rollups=not args.no_rollups,
+        seed=args.seed,
+    ))
@@ -0,0 +1,84 @@
+"""
+Compact MessagePack encoding for MQTT payloads and WebSocket frames.
+
+Known keys are replaced by small integer field IDs, so a reading costs a few
+bytes per value instead of repeating names like "out_conductivity". Keys
+without an ID are kept as strings. JSON stays the default everywhere; the
+compact form is chosen per MQTT topic suffix and per WebSocket client.
+"""
+import json
+from datetime import datetime, timezone
+
+try:
+    import msgpack
+except ImportError:  # optional dependency, only needed for the compact encoding
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# MQTT topics ending in this suffix carry compact payloads (sensores/<device>/mp)
+MSGPACK_TOPIC_SUFFIX = "/mp"
+
+# Never renumber existing IDs: devices in the field encode with this table.
+# emulator/app.py keeps a copy.
+FIELD_IDS = {
+    "timestamp": 0,
+    "device_id": 1,
+    "in_ph": 2,
+    "in_conductivity": 3,
+    "in_turbidity": 4,
+    "in_color": 5,
+    "out_ph": 6,
+    "out_conductivity": 7,
+    "out_turbidity": 8,
+    "out_color": 9,
+    "filter_operating_hours": 10,
+    "eficiencia": 11,
+    "source": 12,
+    "_id": 13,
+    "rul": 14,
+}
+ID_FIELDS = {field_id: name for name, field_id in FIELD_IDS.items()}
+
+
+def available_encodings():
+    return (JSON, MSGPACK) if msgpack is not None else (JSON,)
+
+
+def _require_msgpack():
+    if msgpack is None:
+        raise RuntimeError("The msgpack encoding needs the 'msgpack' package")
+
+
+def encode_compact(data: dict) -> bytes:
+    _require_msgpack()
+    return msgpack.packb({FIELD_IDS.get(k, k): v for k, v in data.items()}, use_bin_type=True)
+
+
+def decode_compact(payload: bytes) -> dict:
+    _require_msgpack()
+    data = {ID_FIELDS.get(k, k): v for k, v in msgpack.unpackb(payload, raw=False, strict_map_key=False).items()}
+
+    # Devices send the timestamp as epoch seconds to save bytes
+    timestamp = data.get("timestamp")
+    if isinstance(timestamp, (int, float)):
+        # Naive UTC like the rest of the stored timestamps
+        data["timestamp"] = datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).isoformat()
+    return data
+
+
+def encode(data: dict, encoding: str = JSON):
+    """
+    Serialize a message: str for JSON, bytes for MessagePack.
+    """
+    if encoding == MSGPACK:
+        return encode_compact(data)
+    # Same compact encoding as WebSocket.send_json
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def decode_mqtt_payload(topic: str, payload: bytes) -> dict:
+    if topic.endswith(MSGPACK_TOPIC_SUFFIX):
+        return decode_compact(payload)
+    return json.loads(payload.decode())
@@ -0,0 +1,92 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING
+
+from app.core.config import COLLECTION_NAME, FILTERS_COLLECTION_NAME, SENSOR_DATA_TIMESERIES
+from app.mqtt.rollups import ROLLUP_COLLECTIONS
+
+logger = logging.getLogger(__name__)
+
+TIMESERIES_OPTIONS = {
+    "timeField": "timestamp",
+    "metaField": "device_id",
+    "granularity": "seconds",
+}
+
+# Indexes backing the queries in app/api/routes.py and the subscriber. The
+# trailing _id keeps the (timestamp, _id) keyset pagination of /data/export
+# an index walk.
+SENSOR_DATA_INDEXES = [
+    [("timestamp", ASCENDING), ("_id", ASCENDING)],
+    [("device_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+    [("source", ASCENDING), ("timestamp", DESCENDING)],
+]
+
+
+class LegacyTimestampsError(RuntimeError):
+    """
+    sensor_data still has string timestamps that could not be converted.
+    """
+
+
+async def is_timeseries(db, name=COLLECTION_NAME):
+    async for info in await db.list_collections(filter={"name": name}):
+        return info.get("type") == "timeseries"
+    return False
+
+
+async def convert_string_timestamps(collection):
+    """
+    Convert ISO string timestamps (emulator/ESP32 format of old documents) to
+    native dates. Runs server side, no documents travel to the client.
+    """
+    result = await collection.update_many(
+        {"timestamp": {"$type": "string"}},
+        [{"$set": {"timestamp": {"$dateFromString": {"dateString": "$timestamp"}}}}],
+    )
+    if result.modified_count:
+        logger.info(f"Converted {result.modified_count} string timestamps to dates")
+    return result.modified_count
+
+
+async def bootstrap_database(db):
+    """
+    Create sensor_data (as a time-series collection when enabled) and the
+    indexes used by the API, and convert legacy string timestamps so every
+    keyset and range query compares dates. Safe to run on every startup.
+    """
+    existing = await db.list_collection_names()
+
+    if COLLECTION_NAME not in existing and SENSOR_DATA_TIMESERIES:
+        await db.create_collection(COLLECTION_NAME, timeseries=TIMESERIES_OPTIONS)
+        logger.info(f"Created time-series collection {COLLECTION_NAME}")
+
+    collection = db[COLLECTION_NAME]
+    for keys in SENSOR_DATA_INDEXES:
+        await collection.create_index(keys)
+
+    if COLLECTION_NAME in existing and not await is_timeseries(db):
+        # Mixed string/date timestamps break the (timestamp, _id) keysets
+        # of the export, the data loader and the backfill, so they are never left behind
+        string_timestamps = await collection.count_documents({"timestamp": {"$type": "string"}}, limit=1)
+        if string_timestamps:
+            logger.warning(f"{COLLECTION_NAME} has ISO string timestamps, converting them to dates")
+            try:
+                await convert_string_timestamps(collection)
+            except Exception as e:
+                raise LegacyTimestampsError(
+                    f"Could not convert the string timestamps of {COLLECTION_NAME} ({e}); fix or remove the "
+                    "offending documents and run 'python -m app.core.migrate' before starting the API"
+                ) from e
+
+    # One rollup document per device and bucket
+    for name in ROLLUP_COLLECTIONS.values():
+        await db[name].create_index([("device_id", ASCENDING), ("bucket", ASCENDING)], unique=True)
+        # Fleet-wide reads page through (bucket, device_id)
+        await db[name].create_index([("bucket", ASCENDING), ("device_id", ASCENDING)])
+
+    # The _id of the filters collection is the device ID, nothing else to index
+    if FILTERS_COLLECTION_NAME not in existing:
+        await db.create_collection(FILTERS_COLLECTION_NAME)
+
+    logger.info(f"Database bootstrap done for {db.name}")
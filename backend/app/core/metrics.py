@@ -0,0 +1,267 @@
+"""
+In-process metrics exposed in the Prometheus text format at /metrics.
+
+Counters, gauges and histograms are plain Python objects updated inline on
+the hot path: an increment is one attribute update, an observation one
+bisect into the bucket bounds. Nothing is formatted until /metrics is
+scraped. Gauges and counters can also be backed by a function, which is how
+state the components already keep (queue depths, connected clients, cache
+hits) is exported without being counted twice.
+"""
+import asyncio
+import logging
+import math
+from bisect import bisect_left
+
+from app.core.config import METRICS_LOOP_LAG_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; from sub-millisecond handler times up to slow model loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _GaugeValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Bucket i holds bounds[i-1] < value <= bounds[i]; the last one is +Inf
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    type = None
+    _value_class = None
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        if function is not None and labelnames:
+            raise ValueError("Function-backed metrics cannot have labels")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_value()
+
+    def _new_value(self):
+        return self._value_class()
+
+    def labels(self, *values):
+        """
+        Child for one combination of label values, created on first use.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_value()
+        return child
+
+    def _value(self, child):
+        if self.function is not None:
+            return self.function()
+        return child.value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in list(self._children.items()):
+            try:
+                value = self._value(child)
+            except Exception as e:
+                logger.warning(f"Metric {self.name} could not be read: {e}")
+                continue
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+    _value_class = _CounterValue
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+    _value_class = _GaugeValue
+
+    def set(self, value):
+        self._default.value = value
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+    def dec(self, amount=1):
+        self._default.value -= amount
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_value(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Named metrics of the process, rendered together for /metrics.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), function=None):
+        return self._register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry every module registers its metrics with
+metrics = MetricsRegistry()
+
+EVENT_LOOP_LAG = metrics.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke up a task that asked to sleep",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+EVENT_LOOP_LAG_MAX = metrics.gauge(
+    "event_loop_lag_max_seconds", "Largest event loop lag since the previous scrape of /metrics"
+)
+
+
+class EventLoopLagMonitor:
+    """
+    Sleeps interval seconds in a loop and records how late each wake-up is;
+    anything blocking the loop (CPU-bound handlers, sync I/O) shows up here.
+    """
+
+    def __init__(self, interval=METRICS_LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            EVENT_LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def collect(self):
+        """
+        Publish the largest lag seen since the previous call and start over.
+        """
+        EVENT_LOOP_LAG_MAX.set(self.max_lag)
+        self.max_lag = 0.0
+
+# Singleton instance
+loop_lag_monitor = EventLoopLagMonitor()
@@ -0,0 +1,82 @@
+"""
+One-shot migration of existing sensor_data documents.
+
+- converts ISO string timestamps (emulator/ESP32 format) to native dates
+- tags documents recorded before device tracking with the default device ID
+- with --to-timeseries, copies a plain sensor_data collection into a new
+  time-series collection, keeping the original as sensor_data_legacy_<date>
+
+Usage (from backend/):
+    python -m app.core.migrate [--to-timeseries] [--batch-size 5000]
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import MONGO_URL, DATABASE_NAME, COLLECTION_NAME
+from app.core.db import TIMESERIES_OPTIONS, bootstrap_database, convert_string_timestamps, is_timeseries
+from app.mqtt.filter_state import DEFAULT_DEVICE_ID
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def tag_default_device(collection):
+    result = await collection.update_many(
+        {"device_id": {"$exists": False}},
+        {"$set": {"device_id": DEFAULT_DEVICE_ID}},
+    )
+    logger.info(f"Tagged {result.modified_count} documents with device_id={DEFAULT_DEVICE_ID!r}")
+
+
+async def copy_to_timeseries(db, batch_size):
+    legacy_name = f"{COLLECTION_NAME}_legacy_{datetime.utcnow():%Y%m%d%H%M%S}"
+    await db[COLLECTION_NAME].rename(legacy_name)
+    await db.create_collection(COLLECTION_NAME, timeseries=TIMESERIES_OPTIONS)
+    logger.info(f"Renamed {COLLECTION_NAME} to {legacy_name} and created a time-series {COLLECTION_NAME}")
+
+    target = db[COLLECTION_NAME]
+    copied = 0
+    batch = []
+    async for doc in db[legacy_name].find({}, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await target.insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+            logger.info(f"Copied {copied} documents")
+    if batch:
+        await target.insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    logger.info(f"Copied {copied} documents into time-series {COLLECTION_NAME}; "
+                f"drop {legacy_name} once the data has been checked")
+
+
+async def migrate(to_timeseries=False, batch_size=5000):
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DATABASE_NAME]
+    collection = db[COLLECTION_NAME]
+
+    if await is_timeseries(db):
+        logger.info(f"{COLLECTION_NAME} is already a time-series collection, nothing to convert")
+    else:
+        await convert_string_timestamps(collection)
+        await tag_default_device(collection)
+        if to_timeseries:
+            await copy_to_timeseries(db, batch_size)
+
+    await bootstrap_database(db)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--to-timeseries", action="store_true",
+                        help="copy sensor_data into a new time-series collection")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(migrate(args.to_timeseries, args.batch_size))
@@ -17,8 +17,7 @@ def main():
     df_real = load_real_data()
 
     if not df_real.empty:
-        df_real = df_real.drop('_id', axis=1)
-        df_real = df_real.drop(columns=['timestamp'])  # Eliminar aquí está bien si no está en features_columns
+        df_real = df_real.drop(columns=['timestamp', 'device_id'])  # Eliminar aquí está bien si no está en features_columns
 
         
         column_list = list(features_columns)
@@ -31,7 +30,7 @@ def main():
         
         
         eficiencia_real, horas_futuras = predict_future_efficiency(
-            model, df_real, scaler_X, scaler_y, features_columns, df
+            model, df_real, scaler_X, scaler_y, features_columns
         )
 
         plot_efficiency_projection(df_real, eficiencia_real, horas_futuras, 'Grafica Realista')
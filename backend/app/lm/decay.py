@@ -0,0 +1,154 @@
+"""
+Online remaining-useful-life estimate from the exponential decay model.
+
+dataset.py and chars.py simulate efficiency as efficiency_0 * exp(-decay * t),
+i.e. ln(efficiency) = ln(efficiency_0) - decay * t. DecayEstimator fits that
+line per filter with recursive least squares on (1, t) -> ln(efficiency):
+every reading costs a handful of float operations and the state is a few
+numbers, whatever the length of the history. The threshold crossing hour
+follows in closed form, t = (ln(threshold) - ln(efficiency_0)) / -decay.
+
+Old readings are forgotten per operating hour, not per reading, so the
+memory of the fit is the same whatever the publish interval of the device.
+"""
+import math
+
+from app.core.config import DECAY_FORGETTING, DECAY_MIN_SAMPLES, DECAY_THRESHOLD
+
+# Initial covariance: a flat prior, so the first readings decide the fit
+_P0 = 1e6
+# Largest exponent math.exp is given; a noisy early slope extrapolated back
+# to hour 0 can ask for far more
+_MAX_EXP = 700.0
+
+
+class DecayEstimator:
+    """
+    Recursive least squares for ln(efficiency) = a + b * (t - t0).
+
+    t0 is the operating hour of the first reading, which keeps the regressor
+    small and the 2x2 covariance well conditioned. forgetting < 1 is the
+    weight left to a reading after one more operating hour, so the estimate
+    follows a filter whose decay changes; readings within the same hour are
+    weighted alike.
+    """
+
+    __slots__ = ("t0", "a", "b", "p00", "p01", "p11", "samples", "last_hours", "forgetting")
+
+    def __init__(self, t0=None, a=0.0, b=0.0, p00=_P0, p01=0.0, p11=_P0, samples=0, last_hours=None,
+                 forgetting=DECAY_FORGETTING):
+        self.t0 = t0
+        self.a = a
+        self.b = b
+        self.p00 = p00
+        self.p01 = p01
+        self.p11 = p11
+        self.samples = samples
+        self.last_hours = last_hours
+        self.forgetting = forgetting
+
+    def update(self, hours, efficiency):
+        """
+        Add one (operating hours, efficiency %) reading. Returns False if it cannot be used.
+        """
+        if efficiency is None or hours is None or efficiency <= 0:
+            return False
+        if self.t0 is None:
+            self.t0 = hours
+
+        x = hours - self.t0
+        y = math.log(efficiency)
+        # Forgetting for the operating time elapsed since the previous reading;
+        # late readings do not age the fit
+        elapsed = 0.0 if self.last_hours is None else max(hours - self.last_hours, 0.0)
+        lam = self.forgetting ** elapsed
+        if self.last_hours is None or hours > self.last_hours:
+            self.last_hours = hours
+
+        # P x and the gain k = P x / (lambda + x' P x), with x = (1, x)
+        px0 = self.p00 + self.p01 * x
+        px1 = self.p01 + self.p11 * x
+        denominator = lam + px0 + px1 * x
+        k0 = px0 / denominator
+        k1 = px1 / denominator
+
+        error = y - (self.a + self.b * x)
+        self.a += k0 * error
+        self.b += k1 * error
+
+        # P = (P - k x' P) / lambda, kept symmetric
+        self.p00 = (self.p00 - k0 * px0) / lam
+        self.p01 = (self.p01 - k0 * px1) / lam
+        self.p11 = (self.p11 - k1 * px1) / lam
+        self.samples += 1
+        return True
+
+    @property
+    def decay_rate(self):
+        """
+        Fitted decay per operating hour (positive while efficiency is falling).
+        """
+        return -self.b
+
+    @property
+    def log_efficiency_0(self):
+        """
+        ln of the fitted efficiency at 0 operating hours.
+        """
+        if self.t0 is None:
+            return None
+        return self.a - self.b * self.t0
+
+    @property
+    def efficiency_0(self):
+        """
+        Fitted efficiency at 0 operating hours (capped, it can be far out while the slope is noisy).
+        """
+        if self.t0 is None:
+            return None
+        return math.exp(min(self.log_efficiency_0, _MAX_EXP))
+
+    def crossing_hour(self, threshold=DECAY_THRESHOLD):
+        """
+        Operating hour at which the fitted curve reaches threshold, None if it never does.
+        """
+        if self.t0 is None or self.b >= 0:
+            return None
+        hour = self.t0 + (math.log(threshold) - self.a) / self.b
+        return hour if math.isfinite(hour) else None
+
+    def estimate(self, hours, threshold=DECAY_THRESHOLD):
+        """
+        Remaining-life summary at the given operating hours, in the terms of
+        get_efficiency_projection_data; None until DECAY_MIN_SAMPLES readings.
+        """
+        if self.samples < DECAY_MIN_SAMPLES:
+            return None
+        hora_cambio = self.crossing_hour(threshold)
+        return {
+            "hora_cambio": round(hora_cambio, 2) if hora_cambio is not None else None,
+            "vida_util_restante": round(max(hora_cambio - hours, 0.0), 2) if hora_cambio is not None else None,
+            "umbral_critico": threshold,
+            "decay_rate": self.decay_rate,
+            "efficiency_0": round(self.efficiency_0, 2),
+            "samples": self.samples,
+        }
+
+    def to_document(self):
+        return {
+            "t0": self.t0,
+            "a": self.a,
+            "b": self.b,
+            "p00": self.p00,
+            "p01": self.p01,
+            "p11": self.p11,
+            "samples": self.samples,
+            "last_hours": self.last_hours,
+        }
+
+    @classmethod
+    def from_document(cls, doc):
+        if not doc:
+            return cls()
+        return cls(**{key: doc[key] for key in ("t0", "a", "b", "p00", "p01", "p11", "samples", "last_hours")
+                      if key in doc})
@@ -0,0 +1,301 @@
+"""
+Background training jobs.
+
+Jobs run one at a time (TRAIN_MAX_WORKERS) in a separate process pool whose
+workers are reniced and pinned to TRAIN_CPU_LIMIT cores, so a fit never
+blocks a request or takes CPU from the API process. Each job writes its
+artifacts to models/versions/<version>/ and reports progress there; a
+finished model is promoted by swapping the models/current link, after which
+the model registry serves it.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from app.core.config import TRAIN_MAX_WORKERS, TRAIN_CPU_LIMIT, TRAIN_NICE
+from app.lm.registry import (
+    MODELS_DIR, KERAS_FILES, versions_path, promote_version, artifacts_hash, model_registry,
+)
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FILE = "progress.json"
+JOB_FILE = "job.json"
+
+# Seconds between checks for the progress file of a queued job
+START_POLL_INTERVAL = 1.0
+
+# Training inputs a job can ask for
+SOURCES = ("simulated", "fleet")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp, path)
+
+
+def _init_worker(cpu_limit, nice):
+    """
+    Process pool initializer: lower priority and cap the cores training may use.
+    """
+    os.environ["OMP_NUM_THREADS"] = str(cpu_limit)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(cpu_limit)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    try:
+        os.nice(nice)
+    except OSError:
+        pass
+    if hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        # Highest numbered cores, leaving the first ones to the API process
+        os.sched_setaffinity(0, cpus[-cpu_limit:])
+
+
+def _train(source, job_dir, epochs, callbacks):
+    from app.lm.train import simulate_data, train_lstm_model, train_lstm_model_streaming
+
+    if source == "simulated":
+        df = simulate_data()
+        return train_lstm_model(df, save_path=job_dir, epochs=epochs, callbacks=callbacks), len(df)
+
+    from app.lm.data_loader import iter_sensor_chunks
+
+    # Fleet history is streamed from MongoDB chunk by chunk, never loaded whole
+    samples = 0
+
+    def chunk_source():
+        nonlocal samples
+        samples = 0
+        for device_id, chunk in iter_sensor_chunks():
+            samples += len(chunk)
+            yield device_id, chunk
+
+    artifacts = train_lstm_model_streaming(chunk_source, save_path=job_dir, epochs=epochs, callbacks=callbacks)
+    return artifacts, samples
+
+
+def run_training_job(job_dir, source="simulated", epochs=30):
+    """
+    Train into job_dir; runs inside a pool worker. Returns the job summary.
+    """
+    import tensorflow as tf
+    from app.lm.numpy_lstm import export_npz
+
+    started = time.time()
+    progress_path = os.path.join(job_dir, PROGRESS_FILE)
+    _write_json(progress_path, {"status": RUNNING, "epoch": 0, "epochs": epochs, "started_at": started})
+
+    class ProgressCallback(tf.keras.callbacks.Callback):
+        loss = None
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.loss = float((logs or {}).get("loss", float("nan")))
+            _write_json(progress_path, {
+                "status": RUNNING,
+                "epoch": epoch + 1,
+                "epochs": epochs,
+                "loss": self.loss,
+                "started_at": started,
+            })
+
+    progress = ProgressCallback()
+
+    (model, scaler_X, scaler_y, features_columns), samples = _train(source, job_dir, epochs, [progress])
+    # The numpy backend serves the same version without TensorFlow
+    version_hash = artifacts_hash(job_dir, KERAS_FILES)
+    export_npz(model, scaler_X, scaler_y, features_columns, job_dir, source_version=version_hash)
+
+    summary = {
+        "source": source,
+        "epochs": epochs,
+        "samples": samples,
+        "loss": progress.loss,
+        "model_version": version_hash,
+        "duration": round(time.time() - started, 2),
+    }
+    _write_json(os.path.join(job_dir, JOB_FILE), summary)
+    return summary
+
+
+class TrainingJob:
+    __slots__ = ("id", "version", "source", "epochs", "promote", "status", "submitted_at",
+                 "finished_at", "result", "error", "promoted")
+
+    def __init__(self, source, epochs, promote):
+        self.id = uuid.uuid4().hex[:12]
+        # Sortable directory name under models/versions
+        self.version = f"{datetime.utcnow():%Y%m%d%H%M%S}-{self.id}"
+        self.source = source
+        self.epochs = epochs
+        self.promote = promote
+        self.status = QUEUED
+        self.submitted_at = datetime.utcnow()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.promoted = False
+
+    def to_dict(self, progress=None):
+        data = {
+            "id": self.id,
+            "version": self.version,
+            "source": self.source,
+            "epochs": self.epochs,
+            "promote": self.promote,
+            "status": self.status,
+            "submitted_at": self.submitted_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "promoted": self.promoted,
+        }
+        if progress:
+            data["progress"] = progress
+        if self.result:
+            data["result"] = self.result
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class TrainingJobRunner:
+    """
+    Queues training jobs on a process pool and promotes the models they produce.
+    """
+
+    def __init__(self, path=MODELS_DIR, max_workers=TRAIN_MAX_WORKERS, cpu_limit=TRAIN_CPU_LIMIT,
+                 nice=TRAIN_NICE, registry=None):
+        self.path = path
+        self.max_workers = max_workers
+        self.cpu_limit = cpu_limit
+        self.nice = nice
+        self.registry = registry
+        self.jobs = {}
+        self._pool = None
+        self._tasks = set()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # spawn: workers must not inherit the event loop, sockets or a TensorFlow runtime
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.cpu_limit, self.nice),
+            )
+        return self._pool
+
+    def job_dir(self, job):
+        return os.path.join(versions_path(self.path), job.version)
+
+    def submit(self, source="simulated", epochs=30, promote=True):
+        if source not in SOURCES:
+            raise ValueError(f"source must be one of {list(SOURCES)}, got {source!r}")
+        job = TrainingJob(source, epochs, promote)
+        os.makedirs(self.job_dir(job))
+        self.jobs[job.id] = job
+
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        logger.info(f"Queued training job {job.id} ({source}, {epochs} epochs)")
+        return job
+
+    def active_job(self):
+        return next((job for job in self.jobs.values() if job.status in (QUEUED, RUNNING)), None)
+
+    async def _watch_start(self, job, job_dir):
+        """
+        Mark the job running once its worker writes the first progress file.
+        """
+        progress_path = os.path.join(job_dir, PROGRESS_FILE)
+        while job.status == QUEUED:
+            if os.path.exists(progress_path):
+                job.status = RUNNING
+                return
+            await asyncio.sleep(START_POLL_INTERVAL)
+
+    async def _run(self, job):
+        loop = asyncio.get_running_loop()
+        job_dir = self.job_dir(job)
+        watcher = loop.create_task(self._watch_start(job, job_dir))
+        try:
+            job.result = await loop.run_in_executor(self.pool, run_training_job, job_dir, job.source, job.epochs)
+            job.status = SUCCEEDED
+            logger.info(f"Training job {job.id} finished: {job.result}")
+            if job.promote:
+                await self.promote(job.version)
+                job.promoted = True
+        except Exception as e:
+            job.status = FAILED
+            job.error = f"{type(e).__name__}: {e}"
+            logger.error(f"Training job {job.id} failed: {job.error}")
+            shutil.rmtree(job_dir, ignore_errors=True)
+        finally:
+            watcher.cancel()
+            job.finished_at = datetime.utcnow()
+
+    async def promote(self, version):
+        promote_version(version, self.path)
+        logger.info(f"Promoted model {version} to current")
+        if self.registry is not None:
+            # Serve it right away instead of on the registry's next poll
+            await asyncio.get_running_loop().run_in_executor(None, self.registry.load)
+
+    def progress(self, job):
+        if job.status != RUNNING and job.status != QUEUED:
+            return None
+        try:
+            with open(os.path.join(self.job_dir(job), PROGRESS_FILE)) as f:
+                progress = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return progress
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        return None if job is None else job.to_dict(self.progress(job))
+
+    def list(self):
+        return [job.to_dict(self.progress(job)) for job in self.jobs.values()]
+
+    def list_versions(self):
+        """
+        Trained versions on disk, newest first, with the summary their job wrote.
+        """
+        root = versions_path(self.path)
+        if not os.path.isdir(root):
+            return []
+        versions = []
+        for name in sorted(os.listdir(root), reverse=True):
+            try:
+                with open(os.path.join(root, name, JOB_FILE)) as f:
+                    summary = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                # Still training
+                continue
+            versions.append({"version": name, **summary})
+        return versions
+
+    async def stop(self):
+        if self._pool is not None:
+            # Queued jobs are dropped; a running fit is left to finish in its worker
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+# Singleton instance
+training_jobs = TrainingJobRunner(registry=model_registry)
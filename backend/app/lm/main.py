@@ -25,7 +25,7 @@ def main():
     
     for name, df_case in test_cases.items():
         eficiencia_real, horas_futuras = predict_future_efficiency(
-            model, df_case, scaler_X, scaler_y, features_columns, df
+            model, df_case, scaler_X, scaler_y, features_columns
         )
         plot_efficiency_projection(df_case, eficiencia_real, horas_futuras, name)
 
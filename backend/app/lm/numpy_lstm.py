@@ -0,0 +1,151 @@
+"""
+TensorFlow-free inference for the LSTM(64) + Dense(1) model of train_lstm_model.
+
+export_npz writes the Keras weights, both MinMaxScalers and the feature
+columns to a single lstm_model.npz; load_npz reads them back as drop-in
+replacements (NumpyLSTM.predict_on_batch, NumpyScaler.transform /
+inverse_transform) using nothing but NumPy.
+
+Convert existing artifacts (needs TensorFlow, from backend/):
+    python -m app.lm.numpy_lstm [--path app/lm/models]
+"""
+import argparse
+import os
+
+import numpy as np
+
+NPZ_FILE = "lstm_model.npz"
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class NumpyLSTM:
+    """
+    Forward pass of a single-layer Keras LSTM (gate order i, f, c, o; tanh
+    activation, sigmoid recurrent activation) followed by a Dense(1) head.
+    """
+
+    def __init__(self, kernel, recurrent_kernel, bias, dense_kernel, dense_bias):
+        self.kernel = kernel.astype(np.float32)
+        self.recurrent_kernel = recurrent_kernel.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.dense_kernel = dense_kernel.astype(np.float32)
+        self.dense_bias = dense_bias.astype(np.float32)
+        self.units = self.recurrent_kernel.shape[0]
+
+    # Rows per forward pass; keeps the gate arrays of large (fleet) batches in cache
+    chunk_size = 512
+
+    def predict_on_batch(self, x):
+        """
+        x: (batch, timesteps, features) -> (batch, 1)
+        """
+        x = np.asarray(x, dtype=np.float32)
+        if len(x) > self.chunk_size:
+            return np.concatenate([
+                self._forward(x[i:i + self.chunk_size]) for i in range(0, len(x), self.chunk_size)
+            ])
+        return self._forward(x)
+
+    def _forward(self, x):
+        batch, timesteps, _ = x.shape
+        units = self.units
+
+        # Input projections of every timestep in one matmul
+        zx = x @ self.kernel + self.bias
+        h = np.zeros((batch, units), dtype=np.float32)
+        c = np.zeros((batch, units), dtype=np.float32)
+        for t in range(timesteps):
+            z = zx[:, t] + h @ self.recurrent_kernel
+            i = _sigmoid(z[:, :units])
+            f = _sigmoid(z[:, units:2 * units])
+            g = np.tanh(z[:, 2 * units:3 * units])
+            o = _sigmoid(z[:, 3 * units:])
+            c = f * c + i * g
+            h = o * np.tanh(c)
+
+        return h @ self.dense_kernel + self.dense_bias
+
+    def predict(self, x, verbose=0, batch_size=None):
+        return self.predict_on_batch(x)
+
+
+class NumpyScaler:
+    """
+    Transform-only equivalent of a fitted sklearn MinMaxScaler.
+    """
+
+    def __init__(self, min_, scale_):
+        self.min_ = np.asarray(min_, dtype=np.float64)
+        self.scale_ = np.asarray(scale_, dtype=np.float64)
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.min_
+
+    def inverse_transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.min_) / self.scale_
+
+
+def export_npz(model, scaler_X, scaler_y, features_columns, path, source_version=""):
+    """
+    Write everything inference needs to path/lstm_model.npz.
+    """
+    lstm = next(layer for layer in model.layers if "lstm" in layer.__class__.__name__.lower())
+    dense = model.layers[-1]
+    kernel, recurrent_kernel, bias = lstm.get_weights()
+    dense_kernel, dense_bias = dense.get_weights()
+
+    target = os.path.join(path, NPZ_FILE)
+    tmp = target + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(
+            f,
+            kernel=kernel,
+            recurrent_kernel=recurrent_kernel,
+            bias=bias,
+            dense_kernel=dense_kernel,
+            dense_bias=dense_bias,
+            x_min=scaler_X.min_,
+            x_scale=scaler_X.scale_,
+            y_min=scaler_y.min_,
+            y_scale=scaler_y.scale_,
+            features_columns=np.array(list(features_columns)),
+            source_version=np.array(source_version),
+        )
+    # Readers never see a half written file
+    os.replace(tmp, target)
+    return target
+
+
+def read_source_version(path):
+    try:
+        with np.load(os.path.join(path, NPZ_FILE)) as data:
+            return str(data["source_version"])
+    except (FileNotFoundError, KeyError):
+        return None
+
+
+def load_npz(path):
+    """
+    Returns model, scaler_X, scaler_y, features_columns like load_trained_model.
+    """
+    with np.load(os.path.join(path, NPZ_FILE)) as data:
+        model = NumpyLSTM(data["kernel"], data["recurrent_kernel"], data["bias"],
+                          data["dense_kernel"], data["dense_bias"])
+        scaler_X = NumpyScaler(data["x_min"], data["x_scale"])
+        scaler_y = NumpyScaler(data["y_min"], data["y_scale"])
+        features_columns = [str(c) for c in data["features_columns"]]
+    return model, scaler_X, scaler_y, features_columns
+
+
+if __name__ == "__main__":
+    from app.lm.load_mode import load_trained_model
+    from app.lm.registry import MODELS_DIR, artifacts_hash
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=MODELS_DIR)
+    args = parser.parse_args()
+    target = export_npz(*load_trained_model(path=args.path), args.path, source_version=artifacts_hash(args.path))
+    print("✅ Exportado:", target)
@@ -1,25 +1,205 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
-def predict_future_efficiency(model, df_case, scaler_X, scaler_y, features_columns, full_df, seq_len=10, future_steps=500):
+
+def build_rollout_windows(last_seq, hour_idx, hour_step, future_steps):
+    """
+    Input windows for every step of the projection, shape (future_steps, seq_len, n_features).
+
+    Each step appends a copy of the last row with the operating hours advanced
+    by hour_step; the model's own output is never fed back. Step k's window is
+    therefore rows k..k+seq_len-1 of one preallocated buffer
+    [last_seq, last + 1*hour_step, last + 2*hour_step, ...], taken as
+    zero-copy sliding views.
+    """
+    seq_len, n_features = last_seq.shape
+    extended = np.empty((seq_len + future_steps - 1, n_features), dtype=np.float64)
+    extended[:seq_len] = last_seq
+    extended[seq_len:] = last_seq[-1]
+    extended[seq_len:, hour_idx] += hour_step * np.arange(1, future_steps)
+    return sliding_window_view(extended, seq_len, axis=0).transpose(0, 2, 1)
+
+
+def build_windows_at(last_seq, hour_idx, hour_step, steps):
+    """
+    Input windows for arbitrary (1-based) projection steps, shape (len(steps), seq_len, n_features).
+
+    Same windows as build_rollout_windows(...)[steps - 1], built directly, so
+    a step thousands of hours ahead costs as much as the first one.
+    """
+    seq_len = last_seq.shape[0]
+    steps = np.asarray(steps, dtype=np.int64)
+    # Row j of the virtual extended buffer is last_seq[j] for j < seq_len and
+    # the last row advanced by (j - seq_len + 1) hour steps afterwards
+    rows = steps[:, None] - 1 + np.arange(seq_len)
+    windows = last_seq[np.minimum(rows, seq_len - 1)]
+    windows[:, :, hour_idx] += np.maximum(rows - seq_len + 1, 0) * hour_step
+    return windows
+
+
+def scaled_hour_step(scaler_X, hour_idx):
+    """
+    One operating hour in the scaled inputs of the serving model. MinMaxScaler
+    and NumpyScaler both map X to X * scale_ + min_, so this is the model's
+    own scale_ and not a range of some reference data it was not fit on.
+    """
+    return float(scaler_X.scale_[hour_idx])
+
+
+def predict_batch(model, windows):
+    """
+    One model call for a whole batch of windows.
+    """
+    return np.asarray(model.predict_on_batch(np.ascontiguousarray(windows, dtype=np.float32))).reshape(-1)
+
+
+def predict_future_efficiency(model, df_case, scaler_X, scaler_y, features_columns, seq_len=10, future_steps=500):
     
     df = df_case.drop(columns=['eficiencia'])
     
     
     X_case = scaler_X.transform(df)
     last_seq = X_case[-seq_len:]
-    current_seq = last_seq.copy()
-
-    future_preds = []
-    for _ in range(future_steps):
-        pred = model.predict(current_seq[np.newaxis, :, :], verbose=0)[0, 0]
-        future_preds.append(pred)
-        next_input = current_seq[-1].copy()
-        hour_idx = list(features_columns).index('filter_operating_hours')
-        next_input[hour_idx] += 1 / full_df['filter_operating_hours'].max()
-        current_seq = np.vstack((current_seq[1:], next_input))
-
-    eficiencia_real = scaler_y.inverse_transform(np.array(future_preds).reshape(-1, 1)).flatten()
+
+    hour_idx = list(features_columns).index('filter_operating_hours')
+    hour_step = scaled_hour_step(scaler_X, hour_idx)
+
+    # The whole horizon is evaluated in a single batched call instead of one
+    # model.predict per step
+    windows = build_rollout_windows(last_seq, hour_idx, hour_step, future_steps)
+    future_preds = predict_batch(model, windows)
+
+    eficiencia_real = scaler_y.inverse_transform(future_preds.reshape(-1, 1)).flatten()
     ultima_hora = df_case['filter_operating_hours'].iloc[-1]
     horas_futuras = np.arange(ultima_hora + 1, ultima_hora + 1 + future_steps)
 
     return eficiencia_real, horas_futuras
+
+
+def predict_future_efficiency_batch(model, df_cases, scaler_X, scaler_y, features_columns, seq_len=10, future_steps=500):
+    """
+    predict_future_efficiency for many series at once.
+
+    df_cases maps a key (e.g. device_id) to its DataFrame. The rollout windows
+    of every series are stacked into one (n_series * future_steps, seq_len,
+    n_features) batch and evaluated with a single model call. Series with
+    fewer than seq_len rows are left out. Returns {key: (eficiencia_real, horas_futuras)}.
+    """
+    hour_idx = list(features_columns).index('filter_operating_hours')
+    hour_step = scaled_hour_step(scaler_X, hour_idx)
+
+    keys = [key for key, df_case in df_cases.items() if len(df_case) >= seq_len]
+    if not keys:
+        return {}
+
+    windows = np.concatenate([
+        build_rollout_windows(
+            scaler_X.transform(df_cases[key].drop(columns=['eficiencia']))[-seq_len:],
+            hour_idx, hour_step, future_steps,
+        )
+        for key in keys
+    ])
+    future_preds = predict_batch(model, windows)
+    eficiencias = scaler_y.inverse_transform(future_preds.reshape(-1, 1)).reshape(len(keys), future_steps)
+
+    results = {}
+    for key, eficiencia_real in zip(keys, eficiencias):
+        ultima_hora = df_cases[key]['filter_operating_hours'].iloc[-1]
+        results[key] = (eficiencia_real, np.arange(ultima_hora + 1, ultima_hora + 1 + future_steps))
+    return results
+
+
+def predict_until_threshold(model, df_case, scaler_X, scaler_y, features_columns, threshold=70,
+                            seq_len=10, max_steps=20000, margin=0, points_per_call=64, max_stride=256):
+    """
+    Adaptive-horizon projection that stops at the threshold crossing.
+
+    Evaluates the projection on a grid whose stride follows the distance to
+    the threshold: each batch of points_per_call steps is spaced so that it
+    reaches about twice the hours to the crossing extrapolated from the last
+    two points (1 to max_stride hours apart), so healthy filters are crossed
+    in a few coarse jumps and the stride shrinks as the curve approaches the
+    threshold. Once a batch brackets the crossing, every hour inside the
+    bracket is evaluated, which gives the same first crossing hour as a dense
+    rollout as long as the curve does not dip below and recover between two
+    grid points. With margin > 0 the curve continues that many hours past
+    the crossing; without a crossing it stops after max_steps hours.
+
+    Returns (eficiencia_real, horas_futuras) for the evaluated steps only, in
+    hour order, ready for get_efficiency_projection_data.
+    """
+    df = df_case.drop(columns=['eficiencia'])
+    X_case = scaler_X.transform(df)
+    last_seq = X_case[-seq_len:]
+
+    hour_idx = list(features_columns).index('filter_operating_hours')
+    hour_step = scaled_hour_step(scaler_X, hour_idx)
+
+    def evaluate(steps):
+        preds = predict_batch(model, build_windows_at(last_seq, hour_idx, hour_step, steps))
+        return scaler_y.inverse_transform(preds.reshape(-1, 1)).flatten()
+
+    evaluated_steps = []
+    evaluated_values = []
+
+    # Dense start: the first hours also seed the slope estimate
+    steps = np.arange(1, min(points_per_call, max_steps) + 1)
+    crossing = None
+    while len(steps):
+        values = evaluate(steps)
+        evaluated_steps.append(steps)
+        evaluated_values.append(values)
+
+        below = np.flatnonzero(values < threshold)
+        if len(below):
+            first = below[0]
+            lower = steps[first - 1] if first > 0 else (evaluated_steps[-2][-1] if len(evaluated_steps) > 1 else 0)
+            # Refine: every hour between the last point above and the first below
+            inside = np.arange(lower + 1, steps[first])
+            if len(inside):
+                inside_values = evaluate(inside)
+                evaluated_steps.append(inside)
+                evaluated_values.append(inside_values)
+                inside_below = np.flatnonzero(inside_values < threshold)
+                crossing = inside[inside_below[0]] if len(inside_below) else steps[first]
+            else:
+                crossing = steps[first]
+            break
+
+        last = steps[-1]
+        if last >= max_steps:
+            break
+        # Stride from the hours left to the threshold at the current slope
+        slope = (values[-2] - values[-1]) / (steps[-1] - steps[-2]) if len(steps) > 1 else 0
+        if slope > 0:
+            hours_left = (values[-1] - threshold) / slope
+            stride = int(np.clip(2 * hours_left / points_per_call, 1, max_stride))
+        else:
+            stride = max_stride
+        end = min(last + stride * points_per_call, max_steps)
+        steps = np.arange(last + stride, end + 1, stride)
+        if len(steps) == 0 or steps[-1] != end:
+            # Always reach max_steps exactly
+            steps = np.append(steps, end)
+
+    if crossing is not None and margin > 0:
+        # Points past the crossing for the plotted curve, at most points_per_call of them
+        known = np.concatenate(evaluated_steps)
+        stride = max(1, -(-margin // points_per_call))
+        extra = np.arange(crossing + stride, crossing + margin + 1, stride)
+        extra = extra[~np.isin(extra, known)]
+        if len(extra):
+            evaluated_steps.append(extra)
+            evaluated_values.append(evaluate(extra))
+
+    steps = np.concatenate(evaluated_steps)
+    values = np.concatenate(evaluated_values)
+    if crossing is not None:
+        # Coarse points beyond crossing + margin were only needed to find it
+        keep = steps <= crossing + max(margin, 0)
+        steps, values = steps[keep], values[keep]
+    order = np.argsort(steps, kind='stable')
+    steps, values = steps[order], values[order]
+
+    ultima_hora = df_case['filter_operating_hours'].iloc[-1]
+    return values, ultima_hora + steps
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+from app.core.config import PROJECTION_CACHE_SIZE
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectionCache:
+    """
+    LRU cache of projection results in front of the model pipeline.
+
+    Keys are (device_id, watermark, model_version, *request parameters),
+    where the watermark is the latest timestamp written for the device. The
+    ingest path advances watermarks and evicts the device's entries on every
+    flush, so a cached result is only served while no newer reading exists.
+    Concurrent requests for the same key share one in-flight computation.
+    """
+
+    def __init__(self, max_entries=PROJECTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._keys_by_device = {}
+        self._inflight = {}
+        self.watermarks = {}
+        self.latest_watermark = None
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def watermark(self, device_id=None):
+        """
+        Latest ingested timestamp of a device, or of the whole fleet when device_id is None.
+        """
+        if device_id is None:
+            return self.latest_watermark
+        return self.watermarks.get(device_id)
+
+    def key(self, device_id, model_version, *params):
+        return (device_id, self.watermark(device_id), model_version, *params)
+
+    async def get_or_compute(self, key, compute):
+        """
+        Return the cached result for key, or await compute() once for all concurrent callers.
+        Results that are None are returned but not cached.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # A task of its own, so a caller that goes away does not cancel it for the others
+            task = asyncio.ensure_future(self._compute(key, compute))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute):
+        try:
+            result = await compute()
+        finally:
+            self._inflight.pop(key, None)
+
+        # Only keep results whose watermark is still current
+        if result is not None and key[1] == self.watermark(key[0]):
+            self._store(key, result)
+        return result
+
+    def _store(self, key, result):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        self._keys_by_device.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._discard_index(old_key)
+
+    def _discard_index(self, key):
+        keys = self._keys_by_device.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_device[key[0]]
+
+    def invalidate(self, device_id):
+        """
+        Drop the cached projections of a device and the fleet-wide ones.
+        """
+        for device in (device_id, None):
+            for key in self._keys_by_device.pop(device, ()):
+                self._entries.pop(key, None)
+                self.invalidations += 1
+
+    async def on_flush(self, documents):
+        devices = set()
+        for document in documents:
+            timestamp = document.get("timestamp")
+            if not isinstance(timestamp, datetime):
+                continue
+            device_id = document.get("device_id")
+            current = self.watermarks.get(device_id)
+            if current is None or timestamp > current:
+                self.watermarks[device_id] = timestamp
+            if self.latest_watermark is None or timestamp > self.latest_watermark:
+                self.latest_watermark = timestamp
+            devices.add(device_id)
+
+        for device_id in devices:
+            self.invalidate(device_id)
+
+    def get_stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+# Singleton instance
+projection_cache = ProjectionCache()
+
+metrics.gauge("projection_cache_entries", "Projections held in the cache", function=lambda: len(projection_cache._entries))
+metrics.counter("projection_cache_hits_total", "Projections answered from the cache",
+                function=lambda: projection_cache.hits)
+metrics.counter("projection_cache_misses_total", "Projections that had to be computed",
+                function=lambda: projection_cache.misses)
+metrics.counter("projection_cache_coalesced_total", "Requests that waited on an identical projection in flight",
+                function=lambda: projection_cache.coalesced)
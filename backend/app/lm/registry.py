@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from app.core.config import MODEL_POLL_INTERVAL, MODEL_BACKEND
+from app.core.metrics import metrics
+from app.lm.numpy_lstm import NPZ_FILE, export_npz, load_npz, read_source_version
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+KERAS_FILES = ("lstm_model.h5", "scaler_X.pkl", "scaler_y.pkl", "features_columns.pkl")
+NUMPY_FILES = (NPZ_FILE,)
+ARTIFACT_FILES = {"keras": KERAS_FILES, "numpy": NUMPY_FILES}
+
+# Trained models live in models/versions/<version>/; models/current is a
+# symlink to the promoted one. Without it the flat models/ layout is served.
+VERSIONS_DIR = "versions"
+CURRENT_LINK = "current"
+
+MODEL_LOAD_SECONDS = metrics.histogram("model_load_seconds", "Time to load a model version", ["backend"],
+                                       buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+
+def versions_path(path=MODELS_DIR):
+    return os.path.join(path, VERSIONS_DIR)
+
+
+def current_version(path=MODELS_DIR):
+    link = os.path.join(path, CURRENT_LINK)
+    if not os.path.islink(link):
+        return None
+    return os.path.basename(os.readlink(link))
+
+
+def resolve_artifacts_path(path=MODELS_DIR):
+    link = os.path.join(path, CURRENT_LINK)
+    if os.path.exists(link):
+        return os.path.realpath(link)
+    return path
+
+
+def promote_version(version, path=MODELS_DIR):
+    """
+    Point models/current at versions/<version> with one atomic rename, so the
+    registry never sees a mix of two versions.
+    """
+    target = os.path.join(versions_path(path), version)
+    if version in ("", ".", "..") or os.path.basename(version) != version or not os.path.isdir(target):
+        raise FileNotFoundError(f"Model version {version!r} does not exist")
+
+    link = os.path.join(path, CURRENT_LINK)
+    tmp = f"{link}.{os.getpid()}.tmp"
+    os.symlink(os.path.join(VERSIONS_DIR, version), tmp)
+    os.replace(tmp, link)
+
+
+def artifacts_signature(path, files=KERAS_FILES):
+    """
+    Cheap change detector: (name, size, mtime) of every artifact, or None if any is missing.
+    """
+    signature = []
+    for name in files:
+        try:
+            stat = os.stat(os.path.join(path, name))
+        except FileNotFoundError:
+            return None
+        signature.append((name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def artifacts_hash(path, files=KERAS_FILES):
+    digest = hashlib.sha256()
+    for name in files:
+        with open(os.path.join(path, name), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class ModelBundle:
+    """
+    Everything a projection needs, loaded together and never mutated.
+    """
+
+    __slots__ = ("model", "scaler_X", "scaler_y", "features_columns", "version", "loaded_at")
+
+    def __init__(self, model, scaler_X, scaler_y, features_columns, version):
+        self.model = model
+        self.scaler_X = scaler_X
+        self.scaler_y = scaler_y
+        self.features_columns = features_columns
+        self.version = version
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """
+    Keeps the LSTM model, scalers and feature columns warm in memory.
+
+    Artifacts are versioned by content hash. A background task polls the
+    models directory (following the models/current link) and, when the files
+    change, loads the new version and swaps it in with a single assignment,
+    so requests always see a complete bundle.
+
+    The "keras" backend loads the .h5 model with TensorFlow and keeps the
+    NumPy export next to it up to date; the "numpy" backend only reads that
+    export and never imports TensorFlow.
+    """
+
+    def __init__(self, path=MODELS_DIR, poll_interval=MODEL_POLL_INTERVAL, backend=MODEL_BACKEND):
+        if backend not in ARTIFACT_FILES:
+            raise ValueError(f"backend must be one of {list(ARTIFACT_FILES)}, got {backend!r}")
+        self.path = path
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self.files = ARTIFACT_FILES[backend]
+        self.current = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._task = None
+
+    def get(self):
+        return self.current
+
+    def load(self):
+        """
+        Load the artifacts on disk if they differ from the current version.
+        Blocking; returns the current bundle (None if there are no artifacts).
+        """
+        with self._lock:
+            path = resolve_artifacts_path(self.path)
+            signature = self._current_signature(path)
+            if signature is None:
+                return self.current
+            if signature == self._signature:
+                return self.current
+
+            version = artifacts_hash(path, self.files)
+            if self.current is not None and version == self.current.version:
+                self._signature = signature
+                return self.current
+
+            start = time.perf_counter()
+            if self.backend == "numpy":
+                model, scaler_X, scaler_y, features_columns = load_npz(path)
+            else:
+                model, scaler_X, scaler_y, features_columns = self._load_keras(path, version)
+            self.current = ModelBundle(model, scaler_X, scaler_y, features_columns, version)
+            self._signature = signature
+            elapsed = time.perf_counter() - start
+            MODEL_LOAD_SECONDS.labels(self.backend).observe(elapsed)
+            logger.info(f"Loaded model version {version} in {elapsed:.2f}s")
+            return self.current
+
+    def _current_signature(self, path):
+        signature = artifacts_signature(path, self.files)
+        return None if signature is None else (path, signature)
+
+    def _load_keras(self, path, version):
+        from app.lm.load_mode import load_trained_model
+
+        model, scaler_X, scaler_y, features_columns = load_trained_model(path=path)
+        if read_source_version(path) != version:
+            export_npz(model, scaler_X, scaler_y, features_columns, path, source_version=version)
+            logger.info(f"Exported model version {version} to {NPZ_FILE}")
+        return model, scaler_X, scaler_y, features_columns
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None:
+            self._task = loop.create_task(self._watch())
+        await loop.run_in_executor(None, self.load)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self._current_signature(resolve_artifacts_path(self.path)) == self._signature:
+                continue
+            try:
+                await loop.run_in_executor(None, self.load)
+            except Exception as e:
+                # Usually artifacts caught half written; retried on the next poll
+                logger.error(f"Error loading new model artifacts: {e}")
+
+# Singleton instance
+model_registry = ModelRegistry()
+
+metrics.gauge("model_loaded", "1 while a model version is being served",
+              function=lambda: int(model_registry.current is not None))
@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 from sklearn.preprocessing import MinMaxScaler
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense
+from app.lm.train import create_sequences
 
 # 1. SIMULACIÓN DE DATOS
 np.random.seed(0)
@@ -32,14 +33,7 @@ scaler_y = MinMaxScaler()
 X_scaled = scaler_X.fit_transform(features)
 y_scaled = scaler_y.fit_transform(target)
 
-# 3. CREAR SECUENCIAS
-def create_sequences(X, y, seq_length):
-    Xs, ys = [], []
-    for i in range(len(X) - seq_length):
-        Xs.append(X[i:i + seq_length])
-        ys.append(y[i + seq_length])
-    return np.array(Xs), np.array(ys)
-
+# 3. CREAR SECUENCIAS (ventanas sin copia, ver train.create_sequences)
 SEQ_LEN = 10
 X_seq, y_seq = create_sequences(X_scaled, y_scaled, SEQ_LEN)
 
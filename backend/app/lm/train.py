@@ -1,12 +1,12 @@
+import itertools
 import os
 import joblib
 import pickle
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense
-import os
 import joblib
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
 
 def simulate_data(n_samples=300):
     np.random.seed(0)
@@ -25,34 +25,100 @@ def simulate_data(n_samples=300):
     df['eficiencia'] = df['eficiencia'].clip(0, 100)
     return df
 
-def train_lstm_model(df, seq_len=10, save_path="backend/app/lm/models"):
-    # Prepara los datos
-    features = df.drop(columns=['eficiencia'])
-    target = df[['eficiencia']]
+def create_sequences(X, y, seq_length):
+    """
+    Training windows X[i:i + seq_length] -> y[i + seq_length] as strided views.
 
-    scaler_X = MinMaxScaler()
-    scaler_y = MinMaxScaler()
+    Returns (len(X) - seq_length, seq_length, n_features) and (len(X) - seq_length, ...)
+    arrays that share memory with X and y instead of copying every window.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    if len(X) <= seq_length:
+        return np.empty((0, seq_length) + X.shape[1:], dtype=X.dtype), y[:0]
+    Xs = sliding_window_view(X, seq_length, axis=0)[:len(X) - seq_length].transpose(0, 2, 1)
+    return Xs, y[seq_length:]
 
-    X_scaled = scaler_X.fit_transform(features)
-    y_scaled = scaler_y.fit_transform(target)
 
-    def create_sequences(X, y, seq_length):
-        Xs, ys = [], []
-        for i in range(len(X) - seq_length):
-            Xs.append(X[i:i + seq_length])
-            ys.append(y[i + seq_length])
-        return np.array(Xs), np.array(ys)
+def frame_chunks(df, chunk_rows=50_000, key=None):
+    """
+    Chunk source over an in-memory DataFrame: (key, chunk) pairs.
+    """
+    for start in range(0, len(df), chunk_rows):
+        yield key, df.iloc[start:start + chunk_rows]
 
-    X_seq, y_seq = create_sequences(X_scaled, y_scaled, seq_len)
 
-    # Entrena el modelo
+def sequence_batches(chunks, scaler_X, scaler_y, features_columns, seq_len=10, batch_size=16, shuffle=True, seed=0):
+    """
+    Stream (X, y) float32 training batches from (key, DataFrame) chunks.
+
+    Only one chunk plus the last seq_len rows of the previous one are held at
+    a time; windows never span two keys (devices). With shuffle, windows are
+    shuffled within each chunk.
+    """
+    rng = np.random.default_rng(seed)
+    features_columns = list(features_columns)
+    carry_key, carry_X, carry_y = None, None, None
+
+    for key, chunk in chunks:
+        X = scaler_X.transform(chunk[features_columns]).astype(np.float32)
+        y = scaler_y.transform(chunk[['eficiencia']]).astype(np.float32)
+        if carry_X is not None and key == carry_key:
+            X = np.concatenate([carry_X, X])
+            y = np.concatenate([carry_y, y])
+        carry_key, carry_X, carry_y = key, X[-seq_len:], y[-seq_len:]
+
+        X_seq, y_seq = create_sequences(X, y, seq_len)
+        order = rng.permutation(len(X_seq)) if shuffle else np.arange(len(X_seq))
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            # Fancy indexing copies just this batch out of the strided view
+            yield X_seq[idx], y_seq[idx]
+
+
+def make_dataset(chunk_source, scaler_X, scaler_y, features_columns, seq_len=10, batch_size=16, shuffle=True,
+                 steps=None):
+    """
+    tf.data pipeline over sequence_batches. chunk_source is called once per
+    epoch and must return a fresh (key, DataFrame) iterator; steps, when
+    known, is the number of batches per epoch.
+    """
+    import tensorflow as tf
+
+    n_features = len(features_columns)
+    # New shuffle order every epoch
+    epoch = itertools.count()
+
+    def generator():
+        yield from sequence_batches(chunk_source(), scaler_X, scaler_y, features_columns,
+                                    seq_len, batch_size, shuffle, seed=next(epoch))
+
+    dataset = tf.data.Dataset.from_generator(
+        generator,
+        output_signature=(
+            tf.TensorSpec(shape=(None, seq_len, n_features), dtype=tf.float32),
+            tf.TensorSpec(shape=(None, 1), dtype=tf.float32),
+        ),
+    )
+    if steps is not None:
+        dataset = dataset.apply(tf.data.experimental.assert_cardinality(steps))
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def build_lstm_model(seq_len, n_features):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, LSTM, Dense
+
     model = Sequential([
-        LSTM(64, input_shape=(X_seq.shape[1], X_seq.shape[2])),
+        Input(shape=(seq_len, n_features)),
+        LSTM(64),
         Dense(1)
     ])
     model.compile(loss='mse', optimizer='adam')
-    model.fit(X_seq, y_seq, epochs=30, batch_size=16, verbose=0)
+    return model
 
+
+def save_artifacts(model, scaler_X, scaler_y, features_columns, save_path):
     # ✅ Guarda el modelo y recursos
     os.makedirs(save_path, exist_ok=True)
 
@@ -64,8 +130,68 @@ def train_lstm_model(df, seq_len=10, save_path="backend/app/lm/models"):
     joblib.dump(scaler_y, os.path.join(save_path, "scaler_y.pkl"))
 
     # Columnas
-    joblib.dump(features.columns.tolist(), os.path.join(save_path, "features_columns.pkl"))
+    joblib.dump(list(features_columns), os.path.join(save_path, "features_columns.pkl"))
 
     print("✅ Modelo, escaladores y columnas guardados en:", save_path)
 
+
+def train_lstm_model(df, seq_len=10, save_path="backend/app/lm/models", epochs=30, callbacks=None):
+    # Prepara los datos
+    features = df.drop(columns=['eficiencia'])
+    target = df[['eficiencia']]
+
+    scaler_X = MinMaxScaler()
+    scaler_y = MinMaxScaler()
+
+    X_scaled = scaler_X.fit_transform(features)
+    y_scaled = scaler_y.fit_transform(target)
+
+    X_seq, y_seq = create_sequences(X_scaled, y_scaled, seq_len)
+
+    # Entrena el modelo
+    model = build_lstm_model(X_seq.shape[1], X_seq.shape[2])
+    model.fit(X_seq, y_seq, epochs=epochs, batch_size=16, verbose=0, callbacks=callbacks)
+
+    save_artifacts(model, scaler_X, scaler_y, features.columns, save_path)
+
     return model, scaler_X, scaler_y, features.columns
+
+
+def train_lstm_model_streaming(chunk_source, seq_len=10, save_path="backend/app/lm/models", epochs=30,
+                               batch_size=16, callbacks=None):
+    """
+    train_lstm_model for histories that do not fit in memory.
+
+    chunk_source() returns an iterator of (device_id, DataFrame) chunks with
+    the feature columns and eficiencia, e.g. data_loader.iter_sensor_chunks
+    or frame_chunks. One pass fits the scalers with partial_fit; every epoch
+    then streams windows through make_dataset, so memory is bounded by the
+    chunk size rather than by the length of the history.
+    """
+    scaler_X = MinMaxScaler()
+    scaler_y = MinMaxScaler()
+    features_columns = None
+    # Batches per epoch, counted the way sequence_batches splits the chunks
+    steps = 0
+    carry_key, carry_rows = None, 0
+    for key, chunk in chunk_source():
+        if features_columns is None:
+            features_columns = [c for c in chunk.columns if c != 'eficiencia']
+        scaler_X.partial_fit(chunk[features_columns])
+        scaler_y.partial_fit(chunk[['eficiencia']])
+
+        rows = len(chunk) + (carry_rows if key == carry_key else 0)
+        steps += -(-max(rows - seq_len, 0) // batch_size)
+        carry_key, carry_rows = key, min(rows, seq_len)
+    if features_columns is None:
+        raise ValueError("No training data")
+
+    dataset = make_dataset(chunk_source, scaler_X, scaler_y, features_columns, seq_len, batch_size, steps=steps)
+
+    model = build_lstm_model(seq_len, len(features_columns))
+    # Windows are already shuffled within each chunk by sequence_batches
+    model.fit(dataset, epochs=epochs, verbose=0, shuffle=False, callbacks=callbacks)
+
+    save_artifacts(model, scaler_X, scaler_y, features_columns, save_path)
+
+    return model, scaler_X, scaler_y, pd.Index(features_columns)
@@ -1,11 +1,19 @@
+import asyncio
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import logging
 import traceback
 from app.api import routes
 from app.api import websocket_routes
-from app.mqtt.subscriber import start_mqtt
+from app.mqtt.subscriber import (
+    start_mqtt, start_mqtt_async, stop_mqtt, ingest_writer, filter_states, live_stats, db, collection, MQTT_MODE
+)
+from app.core.db import bootstrap_database, LegacyTimestampsError
+from app.lm.registry import model_registry
+from app.lm.data_loader import sensor_data_loader
+from app.lm.jobs import training_jobs
+from app.core.metrics import metrics, loop_lag_monitor, CONTENT_TYPE
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -50,12 +58,19 @@ async def websocket_info():
     return {
         "websocket_path": "/ws",
         "active_connections": len(manager.active_connections),
+        "fanout": manager.get_metrics(),
         "routes": [
             {"path": route.path, "name": route.name, "methods": route.methods}
             for route in app.routes
         ]
     }
 
+# Prometheus scrape target
+@app.get("/metrics")
+async def get_metrics():
+    loop_lag_monitor.collect()
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
 # MQTT client instance
 mqtt_client = None
 
@@ -63,11 +78,41 @@ mqtt_client = None
 async def startup_event():
     global mqtt_client
     logger.info("Starting FastAPI application...")
+    await loop_lag_monitor.start()
     
+    try:
+        # Collections and indexes used by the API and the subscriber
+        await bootstrap_database(db)
+    except LegacyTimestampsError:
+        # Serving a collection with mixed timestamp types gives wrong query results
+        raise
+    except Exception as e:
+        logger.error(f"Error bootstrapping database: {e}")
+
+    # Start the batched DB writer and load filter states before messages can arrive
+    await ingest_writer.start()
+    try:
+        await filter_states.start(sensor_collection=collection)
+    except Exception as e:
+        logger.error(f"Error loading filter states: {e}")
+    try:
+        await live_stats.start()
+    except Exception as e:
+        logger.error(f"Error seeding live stats: {e}")
+
+    try:
+        # Load the projection model once and watch for new artifacts
+        await model_registry.start()
+    except Exception as e:
+        logger.error(f"Error loading model: {e}")
+
     try:
         # Start MQTT client
-        mqtt_client = start_mqtt()
-        logger.info("MQTT client started successfully")
+        if MQTT_MODE == "thread":
+            mqtt_client = start_mqtt(asyncio.get_running_loop())
+        else:
+            mqtt_client = await start_mqtt_async()
+        logger.info(f"MQTT client started successfully ({MQTT_MODE} mode)")
     except Exception as e:
         logger.error(f"Error starting MQTT client: {e}")
         logger.error(traceback.format_exc())
@@ -79,5 +124,13 @@ async def shutdown_event():
     
     if mqtt_client:
         logger.info("Stopping MQTT client...")
-        mqtt_client.loop_stop()
-        mqtt_client.disconnect()
\ No newline at end of file
+        await stop_mqtt(mqtt_client)
+
+    # Flush documents still waiting in the ingest queue
+    await ingest_writer.stop()
+    await filter_states.stop()
+    await live_stats.stop()
+    await model_registry.stop()
+    sensor_data_loader.close()
+    await training_jobs.stop()
+    await loop_lag_monitor.stop()
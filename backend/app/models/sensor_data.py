@@ -8,3 +8,9 @@ class SensorData(BaseModel):
     turbidez: float
     color: float
     source: str  # "entrada" o "salida"
+
+# Numeric fields of the consolidated readings published over MQTT
+SENSOR_FIELDS = [
+    "in_ph", "in_conductivity", "in_turbidity", "in_color",
+    "out_ph", "out_conductivity", "out_turbidity", "out_color",
+]
@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+from typing import Literal
+
+class TrainingRequest(BaseModel):
+    source: Literal["simulated", "fleet"] = "simulated"  # simulate_data() o datos reales de la flota
+    epochs: int = Field(30, ge=1, le=500)
+    promote: bool = True  # servir el modelo apenas termine
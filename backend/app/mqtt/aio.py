@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import socket
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+
+class _PreconnectedClient(mqtt.Client):
+    """
+    paho client that uses a TCP socket connected beforehand, so connect()
+    never calls the blocking socket.create_connection on the event loop.
+    """
+
+    preconnected_socket = None
+
+    def _create_socket_connection(self):
+        sock, self.preconnected_socket = self.preconnected_socket, None
+        if sock is None:
+            return super()._create_socket_connection()
+        return sock
+
+
+class AsyncioMqttClient:
+    """
+    Runs a paho client on the running asyncio loop instead of paho's network thread.
+
+    The socket is registered with loop.add_reader/add_writer, so on_message is
+    called on the event loop thread and can hand messages to coroutines without
+    run_coroutine_threadsafe. The broker address is resolved and the TCP
+    connection opened with the loop's own getaddrinfo and sock_connect, within
+    connect_timeout seconds, before paho takes the socket over. Lost
+    connections are re-established in the background with asyncio.sleep
+    between attempts.
+    """
+
+    def __init__(self, host, port, topic, on_message, keepalive=60, retry_delay=5, max_retries=5,
+                 connect_timeout=5):
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.keepalive = keepalive
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.connect_timeout = connect_timeout
+
+        self.loop = None
+        self.client = _PreconnectedClient(mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = on_message
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
+        self._misc_task = None
+        self._reconnect_task = None
+        self._stopping = False
+
+    async def start(self):
+        """
+        Connect to the broker, retrying up to max_retries times without blocking the loop.
+        """
+        self.loop = asyncio.get_running_loop()
+        retries = 0
+        while True:
+            try:
+                logger.info(f"Attempting to connect to MQTT broker at {self.host}:{self.port} "
+                            f"(attempt {retries + 1}/{self.max_retries})")
+                await self._connect()
+                logger.info("Successfully connected to MQTT broker")
+                return self
+            except Exception as e:
+                retries += 1
+                logger.error(f"Failed to connect to MQTT broker: {e}")
+                if retries >= self.max_retries:
+                    logger.error("Maximum retries reached. Could not connect to MQTT broker.")
+                    raise
+                logger.info(f"Retrying in {self.retry_delay} seconds...")
+                await asyncio.sleep(self.retry_delay)
+
+    async def stop(self):
+        self._stopping = True
+        for task in (self._reconnect_task, self._misc_task):
+            if task is not None:
+                task.cancel()
+        self.client.disconnect()
+
+    async def _open_socket(self):
+        """
+        Non-blocking TCP connection to the broker, trying each resolved address in turn.
+        """
+        infos = await self.loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+        error = None
+        for family, type_, proto, _, address in infos:
+            sock = socket.socket(family, type_, proto)
+            sock.setblocking(False)
+            try:
+                await asyncio.wait_for(self.loop.sock_connect(sock, address), self.connect_timeout)
+                return sock
+            except (OSError, asyncio.TimeoutError) as e:
+                sock.close()
+                error = e
+        if isinstance(error, asyncio.TimeoutError):
+            raise TimeoutError(f"Timed out connecting to {self.host}:{self.port}")
+        raise error
+
+    async def _connect(self):
+        # paho only sends CONNECT over the socket opened here
+        self.client.preconnected_socket = await self._open_socket()
+        self.client.connect(self.host, self.port, self.keepalive)
+
+    async def _reconnect(self):
+        while not self._stopping:
+            await asyncio.sleep(self.retry_delay)
+            try:
+                logger.info(f"Reconnecting to MQTT broker at {self.host}:{self.port}")
+                await self._connect()
+                logger.info("Reconnected to MQTT broker")
+                return
+            except Exception as e:
+                logger.error(f"MQTT reconnect failed: {e}")
+
+    async def _misc_loop(self):
+        # Keepalive pings and retries that paho would otherwise run in its thread
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        logger.info(f"Connected to MQTT Broker with reason code {reason_code}")
+        client.subscribe(self.topic)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        if self._stopping:
+            return
+        logger.warning(f"Disconnected from MQTT broker ({reason_code}), scheduling reconnect")
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = self.loop.create_task(self._reconnect())
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc_task = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
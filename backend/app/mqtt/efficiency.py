@@ -0,0 +1,160 @@
+"""
+Filter efficiency model applied to every reading.
+
+Efficiency starts at 100% and decreases with operating time; the
+input-output differentials of pH, turbidity and conductivity adjust it and
+normal noise simulates real-world variation.
+
+calculate_efficiency is the per-message path: plain Python floats, no NumPy
+call. calculate_efficiency_batch evaluates the same model over whole columns
+(backfill, batch ingest, retraining data). Noise comes from a per-device
+EfficiencyNoise, a seeded numpy Generator whose draws are made in blocks, so
+a device gets the same noise sequence whether its readings are processed one
+by one or in batches, and the same one again on the next run.
+"""
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import EFFICIENCY_SEED
+
+NOISE_STD = 1.5
+
+# Values used when a reading lacks a parameter
+EFFICIENCY_DEFAULTS = {
+    "in_ph": 7.0, "out_ph": 7.0,
+    "in_turbidity": 2.0, "out_turbidity": 1.0,
+    "in_conductivity": 400, "out_conductivity": 300,
+}
+
+# Noise values drawn per refill of a device's buffer
+NOISE_BLOCK = 32
+
+
+class EfficiencyNoise:
+    """
+    Normal(0, NOISE_STD) draws of one device. next() serves the scalar path
+    from a small pre-drawn buffer; take(n) returns an array and continues the
+    same sequence.
+    """
+
+    __slots__ = ("rng", "_buffer", "_index")
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self._buffer = []
+        self._index = 0
+
+    def next(self):
+        if self._index >= len(self._buffer):
+            self._buffer = self.rng.normal(0, NOISE_STD, NOISE_BLOCK).tolist()
+            self._index = 0
+        value = self._buffer[self._index]
+        self._index += 1
+        return value
+
+    def take(self, n):
+        buffered = self._buffer[self._index:self._index + n]
+        self._index += len(buffered)
+        if len(buffered) == n:
+            return np.array(buffered, dtype=np.float64)
+        return np.concatenate([np.array(buffered, dtype=np.float64), self.rng.normal(0, NOISE_STD, n - len(buffered))])
+
+
+class EfficiencyNoiseRegistry:
+    """
+    One EfficiencyNoise per device, seeded from (seed, device ID) so the
+    streams are independent of each other and of the order devices appear in.
+    seed=None gives unseeded, non-reproducible streams.
+    """
+
+    def __init__(self, seed=EFFICIENCY_SEED):
+        self.seed = seed
+        self._devices = {}
+
+    def get(self, device_id):
+        noise = self._devices.get(device_id)
+        if noise is None:
+            seed = None if self.seed is None else [self.seed, zlib.crc32(str(device_id).encode())]
+            noise = self._devices[device_id] = EfficiencyNoise(seed)
+        return noise
+
+
+def _reading(data, name):
+    value = data.get(name)
+    # value != value: NaN
+    return EFFICIENCY_DEFAULTS[name] if value is None or value != value else value
+
+
+def calculate_efficiency(operating_hours, data, noise):
+    """
+    Efficiency (%) of one reading; noise is the device's EfficiencyNoise.
+    """
+    # Base efficiency starts at 100% and decreases over time
+    base_efficiency = 100 - (operating_hours * 0.1)
+    random_factor = noise.next()
+
+    # Higher differentials between input and output suggest better filter performance
+    get = data.get
+    try:
+        ph_factor = 1.0 - (abs(get("in_ph", 7.0) - get("out_ph", 7.0)) / 10)
+        turbidity_factor = 2.0 * abs(get("in_turbidity", 2.0) - get("out_turbidity", 1.0)) / 5.0
+        conductivity_factor = abs(get("in_conductivity", 400) - get("out_conductivity", 300)) / 500
+        efficiency = base_efficiency + random_factor + (turbidity_factor * 5) - (ph_factor * 2) + (conductivity_factor * 3)
+    except TypeError:
+        efficiency = float("nan")
+
+    if efficiency != efficiency:
+        # Slow path for None or NaN readings, which take their defaults like in the batch function
+        try:
+            ph_factor = 1.0 - (abs(_reading(data, "in_ph") - _reading(data, "out_ph")) / 10)
+            turbidity_factor = 2.0 * abs(_reading(data, "in_turbidity") - _reading(data, "out_turbidity")) / 5.0
+            conductivity_factor = abs(_reading(data, "in_conductivity") - _reading(data, "out_conductivity")) / 500
+        except TypeError:
+            # Non-numeric readings: operating time only
+            return max(0, min(100, base_efficiency + random_factor))
+        efficiency = base_efficiency + random_factor + (turbidity_factor * 5) - (ph_factor * 2) + (conductivity_factor * 3)
+
+    # Ensure efficiency stays within valid range (0-100%)
+    return round(max(0, min(100, efficiency)), 2)
+
+
+def calculate_efficiency_batch(operating_hours, readings, noise):
+    """
+    calculate_efficiency over arrays: operating_hours and noise are arrays of
+    one value per reading, readings a DataFrame or a dict of columns; missing
+    columns and NaN values take EFFICIENCY_DEFAULTS.
+    """
+    operating_hours = np.asarray(operating_hours, dtype=np.float64)
+    n = len(operating_hours)
+
+    def column(name):
+        if name not in readings:
+            return np.full(n, EFFICIENCY_DEFAULTS[name], dtype=np.float64)
+        values = np.asarray(readings[name], dtype=np.float64)
+        return np.where(np.isnan(values), EFFICIENCY_DEFAULTS[name], values)
+
+    ph_factor = 1.0 - np.abs(column("in_ph") - column("out_ph")) / 10
+    turbidity_factor = 2.0 * np.abs(column("in_turbidity") - column("out_turbidity")) / 5.0
+    conductivity_factor = np.abs(column("in_conductivity") - column("out_conductivity")) / 500
+
+    efficiency = (100 - operating_hours * 0.1) + noise + turbidity_factor * 5 - ph_factor * 2 + conductivity_factor * 3
+    return np.round(np.clip(efficiency, 0, 100), 2)
+
+
+def device_noise_batch(device_ids, registry):
+    """
+    Noise array for a column of device IDs, each device drawing from its own stream in row order.
+    """
+    noise = np.empty(len(device_ids), dtype=np.float64)
+    codes, devices = pd.factorize(np.asarray(device_ids, dtype=object))
+    if len(devices) == 1:
+        return registry.get(devices[0]).take(len(codes))
+    order = np.argsort(codes, kind="stable")
+    for device_id, rows in zip(devices, np.split(order, np.cumsum(np.bincount(codes))[:-1])):
+        noise[rows] = registry.get(device_id).take(len(rows))
+    return noise
+
+# Streams of the live ingest path
+efficiency_noise = EfficiencyNoiseRegistry()
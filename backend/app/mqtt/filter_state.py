@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from app.core.config import FILTER_STATE_PERSIST_INTERVAL
+from app.lm.decay import DecayEstimator
+
+logger = logging.getLogger(__name__)
+
+# Device used for messages published on the legacy single topic "sensores/data"
+DEFAULT_DEVICE_ID = "default"
+
+
+def parse_device_id(topic):
+    """
+    Extract the device ID from a topic like "sensores/<device>/data".
+
+    Topics without a device segment ("sensores/data") map to DEFAULT_DEVICE_ID.
+    """
+    parts = topic.split("/")
+    if len(parts) >= 3 and parts[1]:
+        return parts[1]
+    return DEFAULT_DEVICE_ID
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime) or value is None:
+        return value
+    return datetime.fromisoformat(value)
+
+
+class FilterState:
+    """
+    In-memory state of one filter: when it was installed, its last reading,
+    its operating hours at that reading and the online decay fit of its
+    efficiency with the latest remaining-life estimate.
+    """
+
+    __slots__ = ("device_id", "installed_at", "last_timestamp", "last_reading", "operating_hours",
+                 "decay", "rul", "dirty")
+
+    def __init__(self, device_id, installed_at, last_timestamp=None, last_reading=None, operating_hours=0.0,
+                 decay=None, rul=None):
+        self.device_id = device_id
+        self.installed_at = installed_at
+        self.last_timestamp = last_timestamp
+        self.last_reading = last_reading
+        self.operating_hours = operating_hours
+        self.decay = decay if decay is not None else DecayEstimator()
+        self.rul = rul
+        self.dirty = False
+
+    def update(self, timestamp, reading):
+        """
+        Record a reading and return the operating hours at its timestamp.
+        """
+        operating_hours = (timestamp - self.installed_at).total_seconds() / 3600
+
+        # Late messages still get their own operating hours but do not move the state back
+        if self.last_timestamp is None or timestamp >= self.last_timestamp:
+            self.last_timestamp = timestamp
+            self.last_reading = reading
+            self.operating_hours = operating_hours
+            self.dirty = True
+
+        return operating_hours
+
+    def observe_efficiency(self, operating_hours, efficiency):
+        """
+        Feed a reading's efficiency to the decay fit and return the remaining-life estimate.
+        """
+        if self.decay.update(operating_hours, efficiency):
+            self.rul = self.decay.estimate(max(operating_hours, self.operating_hours))
+            self.dirty = True
+        return self.rul
+
+    def to_document(self):
+        """
+        Fields stored in the filters collection, whose _id is the device ID.
+        """
+        return {
+            "installed_at": self.installed_at,
+            "last_timestamp": self.last_timestamp,
+            "last_reading": self.last_reading,
+            "operating_hours": self.operating_hours,
+            "decay": self.decay.to_document(),
+            "rul": self.rul,
+        }
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(
+            device_id=doc["_id"],
+            installed_at=_as_datetime(doc["installed_at"]),
+            last_timestamp=_as_datetime(doc.get("last_timestamp")),
+            last_reading=doc.get("last_reading"),
+            operating_hours=doc.get("operating_hours", 0.0),
+            decay=DecayEstimator.from_document(doc.get("decay")),
+            rul=doc.get("rul"),
+        )
+
+
+class FilterStateCache:
+    """
+    Filter states for the whole fleet, keyed by device ID.
+
+    All states are loaded from the filters collection in one query at startup;
+    afterwards the hot path only touches the dict, and changed states are
+    written back in bulk every persist_interval seconds.
+    """
+
+    def __init__(self, collection, persist_interval=FILTER_STATE_PERSIST_INTERVAL):
+        self.collection = collection
+        self.persist_interval = persist_interval
+        self.states = {}
+        self._task = None
+
+    async def load(self, sensor_collection=None):
+        self.states = {}
+        async for doc in self.collection.find({}):
+            state = FilterState.from_document(doc)
+            self.states[state.device_id] = state
+
+        # Data recorded before devices were tracked belongs to the default
+        # device, whose clock used to start at the oldest reading
+        if DEFAULT_DEVICE_ID not in self.states and sensor_collection is not None:
+            first_doc = await sensor_collection.find_one(sort=[("timestamp", 1)])
+            if first_doc:
+                state = FilterState(DEFAULT_DEVICE_ID, _as_datetime(first_doc["timestamp"]))
+                state.dirty = True
+                self.states[DEFAULT_DEVICE_ID] = state
+
+        logger.info(f"Loaded state for {len(self.states)} filters")
+
+    def get(self, device_id, timestamp):
+        """
+        Return the state of a device, registering it as installed at timestamp if unknown.
+        """
+        state = self.states.get(device_id)
+        if state is None:
+            state = FilterState(device_id, timestamp)
+            state.dirty = True
+            self.states[device_id] = state
+        return state
+
+    async def persist(self):
+        dirty = [state for state in self.states.values() if state.dirty]
+        if not dirty:
+            return 0
+
+        for state in dirty:
+            state.dirty = False
+        operations = [
+            UpdateOne({"_id": state.device_id}, {"$set": state.to_document()}, upsert=True)
+            for state in dirty
+        ]
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            for state in dirty:
+                state.dirty = True
+            logger.error(f"Error persisting filter states: {e}")
+            return 0
+        return len(dirty)
+
+    async def start(self, sensor_collection=None):
+        if self._task is None:
+            self._task = asyncio.create_task(self._persist_loop())
+        await self.load(sensor_collection)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.persist()
+
+    async def _persist_loop(self):
+        while True:
+            await asyncio.sleep(self.persist_interval)
+            await self.persist()
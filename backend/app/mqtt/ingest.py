@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+
+from pymongo.errors import BulkWriteError
+
+from app.core.config import (
+    INGEST_BATCH_SIZE,
+    INGEST_MAX_LATENCY,
+    INGEST_QUEUE_SIZE,
+    INGEST_BACKPRESSURE,
+)
+from app.core.metrics import metrics, SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+INSERT_SECONDS = metrics.histogram("ingest_insert_seconds", "insert_many round trip per batch")
+BATCH_SIZE = metrics.histogram("ingest_batch_size", "Documents per insert_many batch", buckets=SIZE_BUCKETS)
+DOCUMENTS = metrics.counter("ingest_documents_total", "Documents written to sensor_data", ["result"])
+INSERTED_DOCUMENTS = DOCUMENTS.labels("inserted")
+FAILED_DOCUMENTS = DOCUMENTS.labels("failed")
+
+
+def written_documents(documents, error):
+    """
+    Documents of an unordered insert_many that failed with the BulkWriteError
+    error which were written anyway, i.e. all but the ones it reports.
+    """
+    failed = {write_error["index"] for write_error in error.details.get("writeErrors", [])}
+    return [document for i, document in enumerate(documents) if i not in failed]
+
+
+class IngestWriter:
+    """
+    Queue-backed writer that groups sensor documents into insert_many batches.
+
+    Documents are put on a bounded asyncio queue and a single background task
+    flushes them when batch_size documents are waiting or max_latency seconds
+    have passed since the first document of the batch arrived.
+    """
+
+    def __init__(self, collection, batch_size=INGEST_BATCH_SIZE, max_latency=INGEST_MAX_LATENCY,
+                 queue_size=INGEST_QUEUE_SIZE, backpressure=INGEST_BACKPRESSURE):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"backpressure must be one of {BACKPRESSURE_POLICIES}, got {backpressure!r}")
+
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+
+        self.queue = None
+        self._task = None
+        self._batch = []
+        self._flushing = None
+        self._flush_hooks = []
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed_batches = 0
+        self.flushed_documents = 0
+        self.failed_documents = 0
+        self.last_batch_size = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def add_flush_hook(self, hook):
+        """
+        Register a coroutine function called with every batch that was written.
+        """
+        self._flush_hooks.append(hook)
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Ingest writer started (batch_size={self.batch_size}, max_latency={self.max_latency}s, "
+            f"queue_size={self.queue_size}, backpressure={self.backpressure})"
+        )
+
+    async def stop(self):
+        """
+        Stop the background task and flush whatever is still queued.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._flushing is not None and not self._flushing.done():
+            await self._flushing
+
+        remaining, self._batch = self._batch, []
+        while not self.queue.empty():
+            remaining.append(self.queue.get_nowait())
+        for i in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[i:i + self.batch_size])
+
+    async def put(self, document):
+        """
+        Queue a document for writing.
+
+        Returns False when the document was discarded by the drop_newest policy.
+        """
+        if self.queue.full():
+            if self.backpressure == "drop_newest":
+                self.dropped += 1
+                return False
+            if self.backpressure == "drop_oldest":
+                self.queue.get_nowait()
+                self.dropped += 1
+
+        await self.queue.put(document)
+        self.enqueued += 1
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            try:
+                async with asyncio.timeout_at(deadline):
+                    while len(self._batch) < self.batch_size:
+                        self._batch.append(await self.queue.get())
+            except TimeoutError:
+                pass
+
+            # Shielded so that stop() never interrupts a write half way through
+            batch, self._batch = self._batch, []
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+
+    async def _flush(self, batch):
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        written = batch
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            inserted = len(batch)
+        except BulkWriteError as e:
+            inserted = e.details.get("nInserted", 0)
+            written = written_documents(batch, e)
+            logger.error(f"Bulk insert partially failed ({len(batch) - inserted}/{len(batch)} documents): "
+                         f"{e.details.get('writeErrors', [])[:1]}")
+        except Exception as e:
+            inserted = 0
+            written = []
+            logger.error(f"Error saving batch of {len(batch)} documents: {e}")
+        latency = time.perf_counter() - start
+
+        self.flushed_batches += 1
+        self.flushed_documents += inserted
+        self.failed_documents += len(batch) - inserted
+        self.last_batch_size = len(batch)
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+        self.total_flush_latency += latency
+        INSERT_SECONDS.observe(latency)
+        BATCH_SIZE.observe(len(batch))
+        INSERTED_DOCUMENTS.inc(inserted)
+        FAILED_DOCUMENTS.inc(len(batch) - inserted)
+
+        if not written:
+            return
+        # Rollups, stats and watermarks only see what is actually in the collection
+        for hook in self._flush_hooks:
+            try:
+                await hook(written)
+            except Exception as e:
+                logger.error(f"Ingest flush hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+    def get_stats(self):
+        avg_latency = self.total_flush_latency / self.flushed_batches if self.flushed_batches else 0.0
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "queue_size": self.queue_size,
+            "batch_size": self.batch_size,
+            "max_latency_s": self.max_latency,
+            "backpressure": self.backpressure,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "flushed_batches": self.flushed_batches,
+            "flushed_documents": self.flushed_documents,
+            "failed_documents": self.failed_documents,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_latency_ms": round(self.last_flush_latency * 1000, 3),
+            "avg_flush_latency_ms": round(avg_latency * 1000, 3),
+            "max_flush_latency_ms": round(self.max_flush_latency * 1000, 3),
+        }
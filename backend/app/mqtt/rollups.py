@@ -0,0 +1,222 @@
+import logging
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from app.models.sensor_data import SENSOR_FIELDS
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FIELDS = SENSOR_FIELDS + ["eficiencia"]
+
+# Resolution -> collection holding one document per (device_id, bucket)
+ROLLUP_COLLECTIONS = {
+    "minute": "sensor_rollup_minute",
+    "hour": "sensor_rollup_hour",
+    "day": "sensor_rollup_day",
+}
+
+
+def bucket_start(timestamp, resolution):
+    if resolution == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown resolution {resolution!r}")
+
+
+class _Bucket:
+    __slots__ = ("count", "last_timestamp", "fields")
+
+    def __init__(self):
+        self.count = 0
+        self.last_timestamp = None
+        # field -> [count, sum, min, max, last]
+        self.fields = {}
+
+    def add(self, document, timestamp):
+        self.count += 1
+        is_last = self.last_timestamp is None or timestamp >= self.last_timestamp
+        if is_last:
+            self.last_timestamp = timestamp
+
+        for field in ROLLUP_FIELDS:
+            value = document.get(field)
+            if not isinstance(value, (int, float)):
+                continue
+            agg = self.fields.get(field)
+            if agg is None:
+                self.fields[field] = [1, value, value, value, value]
+                continue
+            agg[0] += 1
+            agg[1] += value
+            if value < agg[2]:
+                agg[2] = value
+            if value > agg[3]:
+                agg[3] = value
+            if is_last:
+                agg[4] = value
+
+    def to_operations(self, device_id, bucket):
+        inc = {"count": self.count}
+        minimum = {}
+        maximum = {}
+        last = {}
+        for field, (count, total, low, high, latest) in self.fields.items():
+            inc[f"{field}.count"] = count
+            inc[f"{field}.sum"] = total
+            minimum[f"{field}.min"] = low
+            maximum[f"{field}.max"] = high
+            last[f"{field}.last"] = latest
+        return _rollup_operations(device_id, bucket, inc, minimum, maximum, self.last_timestamp, last)
+
+
+def _rollup_operations(device_id, bucket, inc, minimum, maximum, last_timestamp, last):
+    """
+    Upsert of the counters of one bucket and the update of its last values.
+    The latter only matches while the stored last_timestamp is older, so a
+    late or out of order batch never overwrites the values of a newer reading;
+    it has to run after the upsert, which creates the bucket.
+    """
+    key = {"device_id": device_id, "bucket": bucket}
+    update = {"$inc": inc}
+    if minimum:
+        update["$min"] = minimum
+    if maximum:
+        update["$max"] = maximum
+    latest = UpdateOne(
+        {**key, "last_timestamp": {"$not": {"$gte": last_timestamp}}},
+        {"$set": {"last_timestamp": last_timestamp, **last}},
+    )
+    return UpdateOne(key, update, upsert=True), latest
+
+
+def build_rollup_updates(documents, resolution):
+    """
+    Pre-aggregate a batch of readings per (device, bucket): the counter
+    upserts and the conditional last value updates to apply after them.
+    """
+    buckets = {}
+    for document in documents:
+        timestamp = document.get("timestamp")
+        if not isinstance(timestamp, datetime):
+            continue
+        key = (document.get("device_id"), bucket_start(timestamp, resolution))
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _Bucket()
+        bucket.add(document, timestamp)
+
+    operations = [agg.to_operations(device_id, bucket) for (device_id, bucket), agg in buckets.items()]
+    return [upsert for upsert, _ in operations], [latest for _, latest in operations]
+
+
+# pandas frequency of each resolution, for build_rollup_updates_frame
+BUCKET_FREQUENCIES = {"minute": "min", "hour": "h", "day": "D"}
+
+
+def build_rollup_updates_frame(df, resolution):
+    """
+    build_rollup_updates for a DataFrame of readings (device_id, timestamp and
+    the rollup fields), aggregated with one groupby instead of per document.
+    """
+    fields = [field for field in ROLLUP_FIELDS if field in df]
+    frame = df[["device_id", "timestamp"] + fields].sort_values("timestamp", kind="stable")
+    frame["bucket"] = frame["timestamp"].dt.floor(BUCKET_FREQUENCIES[resolution])
+    grouped = frame.groupby(["device_id", "bucket"], sort=False)
+
+    keys = grouped.size()
+    counts = keys.tolist()
+    last_timestamps = grouped["timestamp"].max().dt.to_pydatetime().tolist()
+    # field -> (field.count, field.sum, field.min, field.max, field.last) value lists
+    columns = {}
+    if fields:
+        values = grouped[fields]
+        # "last" is the last non-null value, which after the stable sort is the latest reading's
+        stats = [values.count(), values.sum(), values.min(), values.max(), values.last()]
+        columns = {field: [stat[field].tolist() for stat in stats] for field in fields}
+    names = {field: tuple(f"{field}.{stat}" for stat in ("count", "sum", "min", "max", "last")) for field in fields}
+
+    operations = []
+    device_ids = keys.index.get_level_values(0).tolist()
+    buckets = list(keys.index.get_level_values(1).to_pydatetime())
+    for i, (device_id, bucket) in enumerate(zip(device_ids, buckets)):
+        inc = {"count": counts[i]}
+        minimum = {}
+        maximum = {}
+        last = {}
+        for field, (count, total, low, high, latest) in columns.items():
+            if not count[i]:
+                continue
+            count_name, sum_name, min_name, max_name, last_name = names[field]
+            inc[count_name] = count[i]
+            inc[sum_name] = total[i]
+            minimum[min_name] = low[i]
+            maximum[max_name] = high[i]
+            last[last_name] = latest[i]
+
+        operations.append(_rollup_operations(device_id, bucket, inc, minimum, maximum, last_timestamps[i], last))
+    return [upsert for upsert, _ in operations], [latest for _, latest in operations]
+
+
+def format_rollup(doc):
+    """
+    API representation of a rollup document, with the mean of every field.
+    """
+    result = {
+        "device_id": doc.get("device_id"),
+        "bucket": doc["bucket"],
+        "count": doc.get("count", 0),
+        "last_timestamp": doc.get("last_timestamp"),
+    }
+    for field in ROLLUP_FIELDS:
+        agg = doc.get(field)
+        if not agg:
+            continue
+        result[field] = {
+            "count": agg["count"],
+            "min": agg["min"],
+            "max": agg["max"],
+            "mean": agg["sum"] / agg["count"],
+            # Not set yet while a batch is between its two writes
+            "last": agg.get("last"),
+        }
+    return result
+
+
+class RollupWriter:
+    """
+    Keeps the minute/hour/day rollup collections up to date from ingest batches.
+
+    Registered as a flush hook of the IngestWriter, so each flushed batch costs
+    one bulk_write per resolution regardless of how many readings it holds.
+    """
+
+    def __init__(self, db):
+        self.collections = {
+            resolution: db[name] for resolution, name in ROLLUP_COLLECTIONS.items()
+        }
+
+    async def on_flush(self, documents):
+        for resolution, collection in self.collections.items():
+            await self._write(resolution, collection, *build_rollup_updates(documents, resolution))
+
+    async def on_frame(self, df):
+        """
+        Same as on_flush for readings already in a DataFrame (bulk imports).
+        """
+        for resolution, collection in self.collections.items():
+            await self._write(resolution, collection, *build_rollup_updates_frame(df, resolution))
+
+    @staticmethod
+    async def _write(resolution, collection, upserts, latest):
+        if not upserts:
+            return
+        try:
+            await collection.bulk_write(upserts, ordered=False)
+            # Separate round trip: the last values need the buckets the upserts create
+            await collection.bulk_write(latest, ordered=False)
+        except Exception as e:
+            logger.error(f"Error updating {resolution} rollups: {e}")
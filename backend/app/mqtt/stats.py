@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from app.core.config import STATS_RECONCILE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+SOURCES = ("entrada", "salida")
+
+STATS_PIPELINE = [
+    {"$facet": {
+        "total": [{"$count": "n"}],
+        "by_source": [
+            {"$match": {"source": {"$in": list(SOURCES)}}},
+            {"$group": {"_id": "$source", "n": {"$sum": 1}}},
+        ],
+        "latest": [
+            {"$sort": {"timestamp": -1}},
+            {"$limit": 1},
+            {"$project": {"_id": 0, "timestamp": 1}},
+        ],
+    }},
+]
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
+
+
+class LiveStats:
+    """
+    Record counts and latest timestamp of sensor_data, kept in memory.
+
+    Seeded with a single $facet aggregation, incremented by every written
+    ingest batch and re-seeded every reconcile_interval seconds to correct drift.
+    """
+
+    def __init__(self, collection, reconcile_interval=STATS_RECONCILE_INTERVAL):
+        self.collection = collection
+        self.reconcile_interval = reconcile_interval
+        self.seeded = False
+        self.total = 0
+        self.by_source = dict.fromkeys(SOURCES, 0)
+        self.latest_timestamp = None
+        self._task = None
+
+    async def seed(self):
+        result = await self.collection.aggregate(STATS_PIPELINE).to_list(length=1)
+        facets = result[0] if result else {}
+
+        total = facets.get("total") or [{"n": 0}]
+        by_source = dict.fromkeys(SOURCES, 0)
+        for group in facets.get("by_source", []):
+            by_source[group["_id"]] = group["n"]
+        latest = facets.get("latest") or [{}]
+
+        self.total = total[0]["n"]
+        self.by_source = by_source
+        self.latest_timestamp = _as_datetime(latest[0].get("timestamp"))
+        self.seeded = True
+
+    def record(self, documents):
+        for document in documents:
+            self.total += 1
+            source = document.get("source")
+            if source in self.by_source:
+                self.by_source[source] += 1
+            timestamp = _as_datetime(document.get("timestamp"))
+            if timestamp is not None and (self.latest_timestamp is None or timestamp > self.latest_timestamp):
+                self.latest_timestamp = timestamp
+
+    async def on_flush(self, documents):
+        self.record(documents)
+
+    def snapshot(self):
+        return {
+            "total_records": self.total,
+            "entrada_records": self.by_source["entrada"],
+            "salida_records": self.by_source["salida"],
+            "latest_timestamp": self.latest_timestamp,
+        }
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._reconcile_loop())
+        await self.seed()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.seed()
+            except Exception as e:
+                logger.error(f"Error reconciling live stats: {e}")
@@ -1,13 +1,21 @@
 import asyncio
-import json
 import os
 import time
-import numpy as np
-from datetime import datetime
+from datetime import datetime, timezone
 import paho.mqtt.client as mqtt
-from app.core.config import MONGO_URL, DATABASE_NAME, COLLECTION_NAME
+from app.core.config import MONGO_URL, DATABASE_NAME, COLLECTION_NAME, FILTERS_COLLECTION_NAME
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.websockets.manager import manager
+from app.mqtt.ingest import IngestWriter
+from app.mqtt.aio import AsyncioMqttClient
+from app.core.codec import decode_mqtt_payload
+from app.mqtt.filter_state import FilterStateCache, parse_device_id
+from app.mqtt.rollups import RollupWriter
+from app.mqtt.stats import LiveStats
+from app.mqtt.efficiency import calculate_efficiency, efficiency_noise
+from app.lm.data_loader import sensor_data_loader
+from app.lm.projection_cache import projection_cache
+from app.core.metrics import metrics
 import logging
 
 
@@ -17,112 +25,166 @@ logger = logging.getLogger(__name__)
 MONGO_CLIENT = AsyncIOMotorClient(MONGO_URL)
 db = MONGO_CLIENT[DATABASE_NAME]
 collection = db[COLLECTION_NAME]
-loop = asyncio.get_event_loop()
+# Event loop that processes messages; set by start_mqtt/start_mqtt_async from the
+# running application loop
+loop = None
+
+# Batched writer shared by every MQTT message
+ingest_writer = IngestWriter(collection)
+
+# Minute/hour/day rollups updated from every flushed batch
+rollup_writer = RollupWriter(db)
+ingest_writer.add_flush_hook(rollup_writer.on_flush)
+
+# Counters behind /api/data/stats
+live_stats = LiveStats(collection)
+ingest_writer.add_flush_hook(live_stats.on_flush)
+
+# New data moves the projection watermarks and evicts stale cached projections
+ingest_writer.add_flush_hook(projection_cache.on_flush)
+ingest_writer.add_flush_hook(sensor_data_loader.on_flush)
+
+# Install time, last reading and operating hours of every filter
+filter_states = FilterStateCache(db[FILTERS_COLLECTION_NAME])
 
 # MQTT Configuration
 MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST", "localhost")
 MQTT_BROKER_PORT = int(os.getenv("MQTT_BROKER_PORT", 1883))
 MAX_RETRIES = 5
 RETRY_DELAY = 5  # seconds
+# "asyncio" runs the client on the application's event loop, "thread" keeps
+# paho's network thread and hands every message over with run_coroutine_threadsafe
+MQTT_MODE = os.getenv("MQTT_MODE", "asyncio")
+MQTT_INBOUND_QUEUE_SIZE = int(os.getenv("MQTT_INBOUND_QUEUE_SIZE", 10000))
+
+# Messages received in asyncio mode, consumed by a single worker task
+inbound_queue = None
+inbound_dropped = 0
+_consumer_task = None
 
-# Global to cache the initial timestamp
-initial_timestamp = None
+# Hot-path metrics: counters and histograms only, nothing is printed per message
+MQTT_MESSAGES = metrics.counter("mqtt_messages_total", "MQTT messages received", ["encoding"])
+MQTT_JSON_MESSAGES = MQTT_MESSAGES.labels("json")
+MQTT_MSGPACK_MESSAGES = MQTT_MESSAGES.labels("msgpack")
+MQTT_DECODE_ERRORS = metrics.counter("mqtt_decode_errors_total", "MQTT messages that could not be decoded")
+MQTT_PROCESS_ERRORS = metrics.counter("mqtt_process_errors_total", "Decoded messages that failed in process_and_save")
+metrics.counter("mqtt_inbound_dropped_total", "Messages dropped because the inbound queue was full",
+                function=lambda: inbound_dropped)
+metrics.gauge("mqtt_inbound_queue_depth", "Messages waiting for process_and_save (asyncio mode)",
+              function=lambda: inbound_queue.qsize() if inbound_queue is not None else 0)
+PROCESS_SECONDS = metrics.histogram("process_and_save_seconds", "Time to handle one reading, queueing and fan-out included")
+
+# Ingest writer state, read when /metrics is scraped
+metrics.gauge("ingest_queue_depth", "Documents waiting for the ingest writer",
+              function=lambda: ingest_writer.queue.qsize() if ingest_writer.queue is not None else 0)
+metrics.counter("ingest_enqueued_total", "Documents queued for writing", function=lambda: ingest_writer.enqueued)
+metrics.counter("ingest_dropped_total", "Documents discarded by the backpressure policy",
+                function=lambda: ingest_writer.dropped)
+metrics.gauge("filter_states", "Filters with state in memory", function=lambda: len(filter_states.states))
 
 def on_connect(client, userdata, flags, reason_code, properties):
     print(f"Connected to MQTT Broker with reason code {reason_code}")
     client.subscribe("sensores/#")
 
+def decode_message(msg):
+    # JSON by default, MessagePack on topics ending in /mp
+    try:
+        payload = decode_mqtt_payload(msg.topic, msg.payload)
+    except Exception:
+        MQTT_DECODE_ERRORS.inc()
+        raise
+    (MQTT_MSGPACK_MESSAGES if msg.topic.endswith("/mp") else MQTT_JSON_MESSAGES).inc()
+    
+    # Topics look like sensores/<device>/data
+    if "device_id" not in payload:
+        payload["device_id"] = parse_device_id(msg.topic)
+    
+    # Add timestamp if missing
+    if "timestamp" not in payload:
+        payload["timestamp"] = datetime.utcnow().isoformat()
+    
+    return payload
+
 def on_message(client, userdata, msg):
+    """
+    Thread mode: runs on paho's network thread
+    """
     try:
-        payload = json.loads(msg.payload.decode())
-        
-        # Add timestamp if missing
-        if "timestamp" not in payload:
-            payload["timestamp"] = datetime.utcnow().isoformat()
+        payload = decode_message(msg)
         
         # Wrap save and broadcast in coroutine
         asyncio.run_coroutine_threadsafe(process_and_save(payload), loop)
     except Exception as e:
-        print(f"Error processing MQTT message: {e}")
+        logger.error(f"Error processing MQTT message: {e}")
 
-def calculate_efficiency(operating_hours, data):
+def on_message_async(client, userdata, msg):
     """
-    Calculate filter efficiency based on operating hours and sensor data
-    The efficiency decreases with operating time and is affected by water quality
+    Asyncio mode: runs on the event loop, so the payload is queued directly
     """
-    # Base efficiency starts at 100% and decreases over time
-    base_efficiency = 100 - (operating_hours * 0.1)
-    
-    # Add some randomness to simulate real-world variations
-    # Use the input-output differential as a factor 
-    # Higher differentials between input and output suggest better filter performance
+    global inbound_dropped
     try:
-        # Use water quality parameters to adjust efficiency
-        ph_factor = 1.0 - (abs(data.get('in_ph', 7.0) - data.get('out_ph', 7.0)) / 10)
-        turbidity_factor = 2.0 * abs(data.get('in_turbidity', 2.0) - data.get('out_turbidity', 1.0)) / 5.0
-        conductivity_factor = abs(data.get('in_conductivity', 400) - data.get('out_conductivity', 300)) / 500
-        
-        # Add random noise
-        random_factor = np.random.normal(0, 1.5)
-        
-        # Calculate final efficiency
-        efficiency = base_efficiency + random_factor + (turbidity_factor * 5) - (ph_factor * 2) + (conductivity_factor * 3)
-        
-        # Ensure efficiency stays within valid range (0-100%)
-        efficiency = max(0, min(100, efficiency))
-        
-        return round(efficiency, 2)
+        inbound_queue.put_nowait(decode_message(msg))
+    except asyncio.QueueFull:
+        inbound_dropped += 1
     except Exception as e:
-        print(f"Error calculating efficiency: {e}")
-        # Return a fallback efficiency calculation if there's an error
-        return max(0, min(100, 100 - (operating_hours * 0.1) + np.random.normal(0, 1.5)))
+        logger.error(f"Error processing MQTT message: {e}")
+
+async def consume_messages():
+    while True:
+        payload = await inbound_queue.get()
+        try:
+            await process_and_save(payload)
+        except Exception as e:
+            MQTT_PROCESS_ERRORS.inc()
+            logger.error(f"Error processing MQTT message: {e}")
 
 async def process_and_save(payload):
-    global initial_timestamp
-    
+    start = time.perf_counter()
+
     # Parse timestamp
     try:
         current_ts = datetime.fromisoformat(payload["timestamp"])
     except Exception:
         current_ts = datetime.utcnow()
+    # Stored as naive UTC like every other write path; filter states and watermarks compare against it
+    if current_ts.tzinfo is not None:
+        current_ts = current_ts.astimezone(timezone.utc).replace(tzinfo=None)
     
-    # Get initial timestamp from DB if not cached
-    if initial_timestamp is None:
-        first_doc = await collection.find_one(sort=[("timestamp", 1)])
-        if first_doc:
-            initial_timestamp = datetime.fromisoformat(first_doc["timestamp"])
-        else:
-            initial_timestamp = current_ts  # First ever message
-    
-    # Calculate operating time in hours
-    delta = current_ts - initial_timestamp
-    operating_hours = delta.total_seconds() / 3600
-    
-    # Calculate efficiency based on operating hours and sensor data
-    efficiency = calculate_efficiency(operating_hours, payload)
+    # Operating time in hours since this device's filter was installed
+    state = filter_states.get(payload["device_id"], current_ts)
+    operating_hours = state.update(current_ts, payload)
     
+    # Calculate efficiency based on operating hours and sensor data, with the device's own noise stream
+    efficiency = calculate_efficiency(operating_hours, payload, efficiency_noise.get(payload["device_id"]))
+
     # Prepare full document
     document = {
         **payload,
+        "timestamp": current_ts,  # stored as a native date, not the ISO string
         "filter_operating_hours": round(operating_hours, 2),
         "eficiencia": efficiency
     }
     
     
-    asyncio.run_coroutine_threadsafe(save_to_db(document), loop)
-    
-    asyncio.run_coroutine_threadsafe(manager.broadcast(document), loop)
-
+    await ingest_writer.put(document)
 
-    print("se hace el broadcast")
-
-async def save_to_db(data):
+    # O(1) update of the device's decay fit, after the reading is queued so a
+    # failing estimate never costs the reading; the remaining-life estimate goes
+    # to WebSocket clients but is not stored with the reading
     try:
-        await collection.insert_one(data)
+        rul = state.observe_efficiency(operating_hours, efficiency)
     except Exception as e:
-        print(f"Error saving to database: {e}")
+        logger.error(f"Error updating decay fit of {payload['device_id']}: {e}")
+        rul = None
+    
+    await manager.broadcast({**document, "rul": rul} if rul is not None else document)
 
-def start_mqtt():
+    PROCESS_SECONDS.observe(time.perf_counter() - start)
+
+def start_mqtt(event_loop):
+    global loop
+    loop = event_loop
+    
     client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
     client.on_connect = on_connect
     client.on_message = on_message
@@ -147,4 +209,36 @@ def start_mqtt():
                 raise
     
     client.loop_start()
-    return client
\ No newline at end of file
+    return client
+
+async def start_mqtt_async():
+    """
+    Start the subscriber on the running event loop (asyncio mode)
+    """
+    global loop, inbound_queue, _consumer_task
+    loop = asyncio.get_running_loop()
+    inbound_queue = asyncio.Queue(maxsize=MQTT_INBOUND_QUEUE_SIZE)
+    _consumer_task = loop.create_task(consume_messages())
+    
+    client = AsyncioMqttClient(
+        MQTT_BROKER_HOST, MQTT_BROKER_PORT, "sensores/#", on_message_async,
+        retry_delay=RETRY_DELAY, max_retries=MAX_RETRIES
+    )
+    try:
+        await client.start()
+    except Exception:
+        _consumer_task.cancel()
+        raise
+    return client
+
+async def stop_mqtt(client):
+    global _consumer_task
+    if isinstance(client, AsyncioMqttClient):
+        await client.stop()
+    else:
+        client.loop_stop()
+        client.disconnect()
+    
+    if _consumer_task is not None:
+        _consumer_task.cancel()
+        _consumer_task = None
@@ -1,39 +1,301 @@
 from fastapi import WebSocket
-from typing import Dict, List, Any
+from typing import Dict, Any, Set
+import asyncio
 import logging
+import time
+from datetime import datetime
 from bson import ObjectId
+from app.core.config import WS_CLIENT_QUEUE_SIZE, WS_SLOW_CONSUMER_POLICY
+from app.core.codec import JSON, available_encodings, encode
+from app.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "disconnect")
+
+FANOUT_SECONDS = metrics.histogram("ws_fanout_seconds", "Time broadcast() takes to encode and queue one message")
+
+
+def _check_names(name, values):
+    """
+    Subscription lists come straight from client JSON; a bare string would
+    otherwise be taken as its characters.
+    """
+    if values is not None and (
+        not isinstance(values, (list, tuple)) or not all(isinstance(value, str) for value in values)
+    ):
+        raise ValueError(f"{name} must be a list of strings")
+
+
+class ClientConnection:
+    """
+    One WebSocket client with its own bounded outbound queue and writer task,
+    so a slow client only delays its own frames.
+
+    devices is None until the client subscribes to specific devices, meaning
+    it receives every message; fields limits the keys sent and min_interval
+    throttles updates per device. encoding is "json" (text frames) or
+    "msgpack" (binary frames with compact field IDs).
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int, encoding: str = JSON):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.task = None
+        self.sent_frames = 0
+        self.dropped_frames = 0
+
+        self.devices: Set[str] = None
+        self.fields: tuple = None
+        self.min_interval = 0.0
+        self.last_sent: Dict[str, float] = {}
+
+    def project(self, data: dict):
+        if self.fields is None:
+            return data
+        return {k: data[k] for k in self.fields if k in data}
+
+    async def _writer(self, manager):
+        try:
+            while True:
+                frame = await self.queue.get()
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+                self.sent_frames += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket send failed, dropping client: {e}")
+            manager.disconnect(self.websocket)
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, queue_size=WS_CLIENT_QUEUE_SIZE, slow_consumer_policy=WS_SLOW_CONSUMER_POLICY):
+        if slow_consumer_policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"slow_consumer_policy must be one of {SLOW_CONSUMER_POLICIES}, "
+                             f"got {slow_consumer_policy!r}")
+        self.queue_size = queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
         self.latest_data: Dict[str, Any] = None
+        self.latest_frame: str = None
+        self.latest_by_device: Dict[str, Dict[str, Any]] = {}
+
+        # Topic index: clients receiving every device, and clients per device ID
+        self.wildcard_subscribers: Set[ClientConnection] = set()
+        self.device_subscribers: Dict[str, Set[ClientConnection]] = {}
+
+        self.broadcasts = 0
+        self.dropped_frames = 0
+        self.throttled_frames = 0
+        self.evicted_clients = 0
 
     @staticmethod
     def clean_data(data):
         return {
-            k: str(v) if isinstance(v, ObjectId) else v
+            k: str(v) if isinstance(v, ObjectId) else v.isoformat() if isinstance(v, datetime) else v
             for k, v in data.items()
         }
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, encoding: str = JSON):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        if encoding not in available_encodings():
+            logger.warning(f"Unsupported WebSocket encoding {encoding!r}, using JSON")
+            encoding = JSON
+        client = ClientConnection(websocket, self.queue_size, encoding)
+        client.task = asyncio.create_task(client._writer(self))
+        self.active_connections[websocket] = client
+        self.wildcard_subscribers.add(client)
         if self.latest_data:
-            await websocket.send_json(self.latest_data)
+            client.queue.put_nowait(encode(self.latest_data, encoding))
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        self._unindex(client)
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def _unindex(self, client: ClientConnection):
+        self.wildcard_subscribers.discard(client)
+        for device_id in client.devices or ():
+            subscribers = self.device_subscribers.get(device_id)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.device_subscribers[device_id]
+
+    def _index(self, client: ClientConnection):
+        if client.devices is None:
+            self.wildcard_subscribers.add(client)
+            return
+        for device_id in client.devices:
+            self.device_subscribers.setdefault(device_id, set()).add(client)
+
+    def subscribe(self, websocket: WebSocket, devices=None, fields=None, max_rate=None, interval=None,
+                  encoding=None):
+        """
+        Restrict a client to some devices and fields and/or throttle it.
+
+        devices=None (or containing "*") subscribes to every device. max_rate
+        is in updates per second per device; interval is the same limit given
+        in seconds between updates. encoding switches the client between
+        "json" and "msgpack" frames.
+        """
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return None
+        _check_names("devices", devices)
+        _check_names("fields", fields)
+        if encoding is not None:
+            if encoding not in available_encodings():
+                raise ValueError(f"Encoding must be one of {list(available_encodings())}")
+            client.encoding = encoding
+
+        self._unindex(client)
+        if devices is None or "*" in devices:
+            client.devices = None
+        else:
+            client.devices = set(client.devices or ()) | set(devices)
+        client.fields = tuple(fields) if fields else None
+        if max_rate:
+            client.min_interval = 1.0 / float(max_rate)
+        elif interval is not None:
+            client.min_interval = float(interval)
+        self._index(client)
+
+        # Bring the new subscription up to date with the latest known values
+        for device_id in (client.devices or ()):
+            latest = self.latest_by_device.get(device_id)
+            if latest is not None:
+                self._enqueue(client, encode(client.project(latest), client.encoding))
+
+        return self._subscription(client)
+
+    def unsubscribe(self, websocket: WebSocket, devices=None):
+        """
+        Stop receiving some devices, or everything when devices is None.
+        A client subscribed to every device stops receiving everything.
+        """
+        client = self.active_connections.get(websocket)
+        if client is None:
+            return None
+        _check_names("devices", devices)
+
+        self._unindex(client)
+        if devices is None or client.devices is None:
+            client.devices = set()
+        else:
+            client.devices = set(client.devices) - set(devices)
+        self._index(client)
+        return self._subscription(client)
+
+    @staticmethod
+    def _subscription(client: ClientConnection):
+        return {
+            "type": "subscription",
+            "devices": sorted(client.devices) if client.devices is not None else ["*"],
+            "fields": list(client.fields) if client.fields else None,
+            "interval": client.min_interval,
+            "encoding": client.encoding,
+        }
+
+    def send_to(self, websocket: WebSocket, data: dict):
+        """
+        Queue a message for a single client, e.g. a protocol reply.
+        """
+        client = self.active_connections.get(websocket)
+        if client is not None:
+            self._enqueue(client, encode(data, client.encoding))
+
+    def _enqueue(self, client: ClientConnection, frame: str):
+        if client.queue.full():
+            if self.slow_consumer_policy == "disconnect":
+                self.evicted_clients += 1
+                logger.warning("Evicting slow WebSocket client")
+                self.disconnect(client.websocket)
+                asyncio.create_task(self._close(client.websocket))
+                return
+            client.queue.get_nowait()
+            client.dropped_frames += 1
+            self.dropped_frames += 1
+        client.queue.put_nowait(frame)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1008)
+        except Exception:
+            pass
 
     async def broadcast(self, data: dict):
+        """
+        Queue a message for the clients subscribed to its device; never waits on a send.
+
+        The message is serialized once per distinct (field projection, encoding)
+        among the recipients rather than once per client.
+        """
+        start = time.perf_counter()
         self.latest_data = self.clean_data(data)
-        for connection in self.active_connections.copy():
-            try:
-                await connection.send_json(self.latest_data)
-            except Exception:
-                self.disconnect(connection)
+        self.latest_frame = encode(self.latest_data)
+        self.broadcasts += 1
+
+        device_id = self.latest_data.get("device_id")
+        if device_id is not None:
+            self.latest_by_device[device_id] = self.latest_data
+
+        targets = list(self.wildcard_subscribers)
+        subscribers = self.device_subscribers.get(device_id)
+        if subscribers:
+            targets.extend(subscribers)
+        if not targets:
+            FANOUT_SECONDS.observe(time.perf_counter() - start)
+            return
+
+        now = asyncio.get_running_loop().time()
+        frames = {(None, JSON): self.latest_frame}
+        for client in targets:
+            if client.min_interval:
+                if now - client.last_sent.get(device_id, float("-inf")) < client.min_interval:
+                    self.throttled_frames += 1
+                    continue
+                client.last_sent[device_id] = now
+
+            key = (client.fields, client.encoding)
+            frame = frames.get(key)
+            if frame is None:
+                frame = frames[key] = encode(client.project(self.latest_data), client.encoding)
+            self._enqueue(client, frame)
+        FANOUT_SECONDS.observe(time.perf_counter() - start)
+
+    def get_metrics(self):
+        depths = [client.queue.qsize() for client in self.active_connections.values()]
+        return {
+            "active_connections": len(self.active_connections),
+            "queue_size": self.queue_size,
+            "slow_consumer_policy": self.slow_consumer_policy,
+            "total_queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "broadcasts": self.broadcasts,
+            "dropped_frames": self.dropped_frames,
+            "throttled_frames": self.throttled_frames,
+            "evicted_clients": self.evicted_clients,
+            "wildcard_subscribers": len(self.wildcard_subscribers),
+            "subscribed_devices": len(self.device_subscribers),
+        }
 
 # Singleton instance
 manager = ConnectionManager()
+
+metrics.gauge("ws_connected_clients", "Open WebSocket connections", function=lambda: len(manager.active_connections))
+metrics.gauge("ws_queued_frames", "Frames waiting in client queues",
+              function=lambda: sum(c.queue.qsize() for c in manager.active_connections.values()))
+metrics.counter("ws_broadcasts_total", "Messages broadcast", function=lambda: manager.broadcasts)
+metrics.counter("ws_dropped_frames_total", "Frames dropped for slow clients", function=lambda: manager.dropped_frames)
+metrics.counter("ws_throttled_frames_total", "Frames skipped by per-client rate limits",
+                function=lambda: manager.throttled_frames)
+metrics.counter("ws_evicted_clients_total", "Slow clients disconnected", function=lambda: manager.evicted_clients)
@@ -0,0 +1,67 @@
+"""
+JSON vs compact MessagePack encoding of sensor readings.
+
+Reports bytes per message and encode/decode throughput for the MQTT payload
+published by the emulator and for the enriched document fanned out over
+WebSocket.
+
+Usage (from backend/):
+    python -m benchmarks.codec --messages 100000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from app.core.codec import MSGPACK, decode_mqtt_payload, encode, encode_compact
+
+MQTT_READING = {
+    "timestamp": datetime(2025, 1, 1, 12, 0, 0).timestamp(),
+    "in_ph": 7.21, "in_conductivity": 451, "in_turbidity": 2.53, "in_color": 0.51,
+    "out_ph": 7.32, "out_conductivity": 201, "out_turbidity": 1.02, "out_color": 0.22,
+}
+
+WS_DOCUMENT = {
+    **MQTT_READING,
+    "timestamp": "2025-01-01T12:00:00",
+    "device_id": "filtro-0042",
+    "_id": "6650f3a2c1d4e5f6a7b8c9d0",
+    "filter_operating_hours": 123.45,
+    "eficiencia": 87.65,
+}
+
+
+def throughput(fn, arg, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(arg)
+    return round(n / (time.perf_counter() - start))
+
+
+def compare(name, json_data, compact_data, n):
+    json_payload = encode(json_data).encode()
+    compact_payload = encode_compact(compact_data)
+    return {
+        "message": name,
+        "json_bytes": len(json_payload),
+        "msgpack_bytes": len(compact_payload),
+        "size_ratio": round(len(compact_payload) / len(json_payload), 3),
+        "json_encode_per_s": throughput(encode, json_data, n),
+        "msgpack_encode_per_s": throughput(lambda d: encode(d, MSGPACK), compact_data, n),
+        "json_decode_per_s": throughput(lambda p: decode_mqtt_payload("sensores/d/data", p), json_payload, n),
+        "msgpack_decode_per_s": throughput(lambda p: decode_mqtt_payload("sensores/d/mp", p), compact_payload, n),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+
+    # JSON devices send an ISO timestamp, compact devices epoch seconds
+    json_reading = dict(MQTT_READING, timestamp=datetime.utcfromtimestamp(MQTT_READING["timestamp"]).isoformat())
+    results = [
+        compare("mqtt_reading", json_reading, MQTT_READING, args.messages),
+        compare("ws_document", WS_DOCUMENT, WS_DOCUMENT, args.messages),
+    ]
+    print(json.dumps(results, indent=2))
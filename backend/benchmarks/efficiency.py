@@ -0,0 +1,100 @@
+"""
+Efficiency model: cost per reading of the old calculate_efficiency (NumPy
+scalar noise from the global generator), the scalar fast path and the
+batch function, plus a check that per-message and batch processing give
+the same values for a device.
+
+Usage (from backend/):
+    python -m benchmarks.efficiency --rows 100000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.mqtt.efficiency import (
+    EfficiencyNoiseRegistry, calculate_efficiency, calculate_efficiency_batch, device_noise_batch,
+)
+
+
+def legacy_calculate_efficiency(operating_hours, data):
+    """
+    The calculate_efficiency subscriber.py used before.
+    """
+    base_efficiency = 100 - (operating_hours * 0.1)
+    try:
+        ph_factor = 1.0 - (abs(data.get('in_ph', 7.0) - data.get('out_ph', 7.0)) / 10)
+        turbidity_factor = 2.0 * abs(data.get('in_turbidity', 2.0) - data.get('out_turbidity', 1.0)) / 5.0
+        conductivity_factor = abs(data.get('in_conductivity', 400) - data.get('out_conductivity', 300)) / 500
+        random_factor = np.random.normal(0, 1.5)
+        efficiency = base_efficiency + random_factor + (turbidity_factor * 5) - (ph_factor * 2) + (conductivity_factor * 3)
+        efficiency = max(0, min(100, efficiency))
+        return round(efficiency, 2)
+    except Exception:
+        return max(0, min(100, 100 - (operating_hours * 0.1) + np.random.normal(0, 1.5)))
+
+
+def synthetic_readings(rows, devices, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {
+        "in_ph": rng.normal(7.2, 0.3, rows), "out_ph": rng.normal(7.3, 0.3, rows),
+        "in_turbidity": rng.uniform(1, 5, rows), "out_turbidity": rng.uniform(0, 2, rows),
+        "in_conductivity": rng.integers(300, 600, rows).astype(np.float64),
+        "out_conductivity": rng.integers(100, 300, rows).astype(np.float64),
+    }
+    device_ids = np.array([f"bench-{i % devices}" for i in range(rows)], dtype=object)
+    hours = np.arange(rows, dtype=np.float64) / devices * 0.01
+    # What the subscriber receives: one dict of Python floats per message
+    messages = [dict(zip(columns, values)) for values in zip(*(c.tolist() for c in columns.values()))]
+    return columns, device_ids, hours, messages
+
+
+def per_row(fn, rows):
+    start = time.perf_counter()
+    fn()
+    return round((time.perf_counter() - start) / rows * 1e9)
+
+
+def main(rows, devices):
+    columns, device_ids, hours, messages = synthetic_readings(rows, devices)
+    hours_list = hours.tolist()
+
+    def legacy():
+        for h, message in zip(hours_list, messages):
+            legacy_calculate_efficiency(h, message)
+
+    def scalar():
+        registry = EfficiencyNoiseRegistry(0)
+        for h, device_id, message in zip(hours_list, device_ids, messages):
+            calculate_efficiency(h, message, registry.get(device_id))
+
+    def batch():
+        registry = EfficiencyNoiseRegistry(0)
+        calculate_efficiency_batch(hours, columns, device_noise_batch(device_ids, registry))
+
+    # Same seed, same device streams: per message and batch must agree
+    registry = EfficiencyNoiseRegistry(0)
+    one_by_one = np.array([calculate_efficiency(h, m, registry.get(d))
+                           for h, d, m in zip(hours_list, device_ids, messages)])
+    registry = EfficiencyNoiseRegistry(0)
+    batched = calculate_efficiency_batch(hours, columns, device_noise_batch(device_ids, registry))
+
+    result = {
+        "rows": rows,
+        "devices": devices,
+        "legacy_ns_per_row": per_row(legacy, rows),
+        "scalar_ns_per_row": per_row(scalar, rows),
+        "batch_ns_per_row": per_row(batch, rows),
+        "scalar_matches_batch": bool(np.allclose(one_by_one, batched, atol=0.011)),
+    }
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--devices", type=int, default=100)
+    args = parser.parse_args()
+    main(args.rows, args.devices)
@@ -0,0 +1,119 @@
+"""
+Throughput comparison of the two MQTT subscriber modes.
+
+Feeds N synthetic messages through the real on_message handlers and measures
+how long it takes until process_and_save has queued all of them for the DB:
+
+  thread  - messages arrive on a separate thread (like paho's network thread)
+            and are handed over with run_coroutine_threadsafe
+  asyncio - messages arrive on the event loop (like AsyncioMqttClient's
+            add_reader callback) and go through the inbound queue
+
+The DB writer is pointed at a collection that discards batches, so the numbers
+isolate the hand-off and processing cost.
+
+Usage (from backend/):
+    python -m benchmarks.mqtt_modes --messages 20000
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from app.mqtt import subscriber
+
+
+class DiscardCollection:
+    async def insert_many(self, documents, ordered=True):
+        return None
+
+
+def make_messages(n):
+    messages = []
+    for i in range(n):
+        msg = mqtt.MQTTMessage(topic=b"sensores/data")
+        msg.payload = json.dumps({
+            "timestamp": datetime.utcnow().isoformat(),
+            "in_ph": 7.2, "in_conductivity": 450, "in_turbidity": 2.5, "in_color": 0.5,
+            "out_ph": 7.3, "out_conductivity": 200, "out_turbidity": 1.0, "out_color": 0.2,
+        }).encode()
+        messages.append(msg)
+    return messages
+
+
+async def wait_for_enqueued(target):
+    while subscriber.ingest_writer.enqueued < target:
+        await asyncio.sleep(0.001)
+
+
+async def run_thread_mode(messages):
+    subscriber.loop = asyncio.get_running_loop()
+    target = subscriber.ingest_writer.enqueued + len(messages)
+
+    def producer():
+        for msg in messages:
+            subscriber.on_message(None, None, msg)
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=producer)
+    thread.start()
+    await wait_for_enqueued(target)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    return elapsed
+
+
+async def run_asyncio_mode(messages, burst):
+    loop = asyncio.get_running_loop()
+    subscriber.loop = loop
+    subscriber.inbound_queue = asyncio.Queue(maxsize=subscriber.MQTT_INBOUND_QUEUE_SIZE)
+    consumer = loop.create_task(subscriber.consume_messages())
+    target = subscriber.ingest_writer.enqueued + len(messages)
+
+    def deliver(offset):
+        # One socket-readable callback delivering a burst of messages
+        for msg in messages[offset:offset + burst]:
+            subscriber.on_message_async(None, None, msg)
+        if offset + burst < len(messages):
+            loop.call_soon(deliver, offset + burst)
+
+    start = time.perf_counter()
+    loop.call_soon(deliver, 0)
+    await wait_for_enqueued(target)
+    elapsed = time.perf_counter() - start
+    consumer.cancel()
+    return elapsed
+
+
+async def main(n, burst):
+    subscriber.ingest_writer.collection = DiscardCollection()
+    await subscriber.ingest_writer.start()
+
+    messages = make_messages(n)
+    results = {}
+    for mode in ("thread", "asyncio"):
+        if mode == "thread":
+            elapsed = await run_thread_mode(messages)
+        else:
+            elapsed = await run_asyncio_mode(messages, burst)
+        results[mode] = {
+            "messages": n,
+            "seconds": round(elapsed, 4),
+            "messages_per_second": round(n / elapsed, 1),
+        }
+
+    await subscriber.ingest_writer.stop()
+    results["speedup"] = round(results["thread"]["seconds"] / results["asyncio"]["seconds"], 2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=50, help="messages delivered per read callback")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.messages, args.burst)), indent=2))
@@ -0,0 +1,96 @@
+"""
+Parity and footprint of the NumPy LSTM backend against Keras.
+
+1. Parity: exports the trained Keras model to a temporary .npz and compares
+   NumpyLSTM / NumpyScaler outputs with Keras on random batches and on the
+   projection windows. Exits with status 1 if they differ by more than --atol.
+2. Footprint: starts a fresh interpreter per backend, loads the model through
+   ModelRegistry and reports wall-clock startup and peak RSS.
+
+Needs TensorFlow and the trained artifacts in app/lm/models.
+
+Usage (from backend/):
+    python -m benchmarks.numpy_lstm
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+STARTUP_SNIPPET = """
+import json, resource, sys, time
+start = time.perf_counter()
+from app.lm.registry import ModelRegistry
+bundle = ModelRegistry(path=sys.argv[1], backend=sys.argv[2]).load()
+bundle.model.predict_on_batch(__import__("numpy").zeros((500, 10, len(bundle.features_columns)), "float32"))
+print(json.dumps({
+    "startup_s": round(time.perf_counter() - start, 3),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "tensorflow_imported": "tensorflow" in sys.modules,
+}))
+"""
+
+
+def parity(atol):
+    from app.lm.load_mode import load_trained_model
+    from app.lm.numpy_lstm import export_npz, load_npz
+    from app.lm.predict import build_rollout_windows
+    from app.lm.registry import MODELS_DIR
+    from app.lm.train import simulate_data
+
+    model, scaler_X, scaler_y, features_columns = load_trained_model(path=MODELS_DIR)
+    with tempfile.TemporaryDirectory() as tmp:
+        export_npz(model, scaler_X, scaler_y, features_columns, tmp)
+        np_model, np_scaler_X, np_scaler_y, np_features = load_npz(tmp)
+
+    assert list(np_features) == list(features_columns)
+    rng = np.random.default_rng(0)
+    df = simulate_data()
+    X = df[list(features_columns)]
+    hour_idx = list(features_columns).index("filter_operating_hours")
+
+    batches = {
+        "random_batch": rng.uniform(0, 1, (256, 10, len(features_columns))).astype(np.float32),
+        "projection_windows": build_rollout_windows(
+            scaler_X.transform(X)[-10:], hour_idx, 1 / df["filter_operating_hours"].max(), 500
+        ).astype(np.float32),
+    }
+    report = {
+        "scaler_X_max_abs_diff": float(np.abs(np_scaler_X.transform(X) - scaler_X.transform(X)).max()),
+        "scaler_y_max_abs_diff": float(np.abs(
+            np_scaler_y.inverse_transform([[0.3], [0.7]]) - scaler_y.inverse_transform([[0.3], [0.7]])).max()),
+    }
+    for name, batch in batches.items():
+        keras_out = np.asarray(model.predict_on_batch(batch))
+        numpy_out = np_model.predict_on_batch(batch)
+        report[f"{name}_max_abs_diff"] = float(np.abs(keras_out - numpy_out).max())
+
+    report["ok"] = all(v <= atol for k, v in report.items() if k.endswith("diff"))
+    return report
+
+
+def footprint(backend):
+    from app.lm.registry import MODELS_DIR
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(
+        [sys.executable, "-c", STARTUP_SNIPPET, MODELS_DIR, backend],
+        cwd=backend_dir, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atol", type=float, default=1e-5)
+    args = parser.parse_args()
+
+    # The keras run also (re)writes lstm_model.npz, so it goes first
+    results = {"footprint": {backend: footprint(backend) for backend in ("keras", "numpy")}}
+    results["parity"] = parity(args.atol)
+    print(json.dumps(results, indent=2))
+    sys.exit(0 if results["parity"]["ok"] else 1)
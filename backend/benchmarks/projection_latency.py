@@ -0,0 +1,159 @@
+"""
+Projection latency against future_steps: the batched rollout in
+app/lm/predict.py vs the previous loop with one model.predict per step.
+
+Also checks that both give the same efficiencies. Needs the trained
+artifacts in app/lm/models. With --fleet, times predict_future_efficiency_batch
+for N series against N separate batched rollouts instead. With --adaptive,
+compares predict_until_threshold with a dense rollout long enough to reach
+the threshold: model evaluations, time and the crossing hour.
+
+Usage (from backend/):
+    python -m benchmarks.projection_latency --steps 50 100 250 500 1000
+    python -m benchmarks.projection_latency --fleet 1 10 100 500
+    python -m benchmarks.projection_latency --adaptive 70 50 30
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.lm.predict import predict_future_efficiency, predict_future_efficiency_batch, predict_until_threshold
+from app.lm.registry import ModelRegistry
+from app.lm.train import simulate_data
+
+
+def reference_rollout(model, df_case, scaler_X, scaler_y, features_columns, seq_len=10, future_steps=500):
+    """
+    The per-step loop predict_future_efficiency used before.
+    """
+    X_case = scaler_X.transform(df_case.drop(columns=['eficiencia']))
+    current_seq = X_case[-seq_len:].copy()
+    future_preds = []
+    for _ in range(future_steps):
+        pred = model.predict(current_seq[np.newaxis, :, :], verbose=0)[0, 0]
+        future_preds.append(pred)
+        next_input = current_seq[-1].copy()
+        hour_idx = list(features_columns).index('filter_operating_hours')
+        next_input[hour_idx] += scaler_X.scale_[hour_idx]
+        current_seq = np.vstack((current_seq[1:], next_input))
+    return scaler_y.inverse_transform(np.array(future_preds).reshape(-1, 1)).flatten()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, round(min(samples) * 1000, 2)
+
+
+def main(steps_list, reference_max_steps, repeat):
+    bundle = ModelRegistry().load()
+    df_case = simulate_data().iloc[200:]
+    args = (bundle.model, df_case, bundle.scaler_X, bundle.scaler_y, bundle.features_columns)
+
+    # Warm up graph tracing for both paths
+    predict_future_efficiency(*args, future_steps=steps_list[0])
+    reference_rollout(*args, future_steps=2)
+
+    results = []
+    for steps in steps_list:
+        (batched, _), batched_ms = timed(lambda: predict_future_efficiency(*args, future_steps=steps), repeat)
+        row = {"future_steps": steps, "batched_ms": batched_ms}
+        if steps <= reference_max_steps:
+            reference, reference_ms = timed(lambda: reference_rollout(*args, future_steps=steps), 1)
+            row["per_step_loop_ms"] = reference_ms
+            row["speedup"] = round(reference_ms / batched_ms, 1)
+            row["max_abs_diff"] = float(np.abs(reference - batched).max())
+        results.append(row)
+        print(json.dumps(row))
+    return results
+
+
+def fleet(sizes, steps, repeat):
+    bundle = ModelRegistry().load()
+    args = (bundle.scaler_X, bundle.scaler_y, bundle.features_columns)
+    # Series cut at different points of the simulated life
+    full_df = simulate_data()
+    n_rows = len(full_df)
+    cases = [full_df.iloc[: 10 + (i * 37) % (n_rows - 10)] for i in range(max(sizes))]
+
+    predict_future_efficiency(bundle.model, cases[0], *args, future_steps=steps)
+
+    results = []
+    for size in sizes:
+        df_cases = dict(enumerate(cases[:size]))
+        batch, batch_ms = timed(
+            lambda: predict_future_efficiency_batch(bundle.model, df_cases, *args, future_steps=steps), repeat)
+        single, single_ms = timed(
+            lambda: [predict_future_efficiency(bundle.model, df, *args, future_steps=steps)[0] for df in cases[:size]], 1)
+        row = {
+            "devices": size,
+            "future_steps": steps,
+            "batch_ms": batch_ms,
+            "sequential_ms": single_ms,
+            "batch_ms_per_device": round(batch_ms / size, 3),
+            "max_abs_diff": float(max(np.abs(batch[i][0] - single[i]).max() for i in range(size))),
+        }
+        results.append(row)
+        print(json.dumps(row))
+    return results
+
+
+def first_crossing(eficiencia, horas, threshold):
+    cruce = np.where(eficiencia < threshold)[0]
+    return float(horas[cruce[0]]) if len(cruce) else None
+
+
+def adaptive(thresholds, max_steps, repeat):
+    bundle = ModelRegistry().load()
+    full_df = simulate_data()
+    cases = {
+        "new": full_df.iloc[:100],
+        "mid": full_df.iloc[100:200],
+        "old": full_df.iloc[200:],
+    }
+    results = []
+    for threshold in thresholds:
+        for name, df_case in cases.items():
+            args = (bundle.model, df_case, bundle.scaler_X, bundle.scaler_y, bundle.features_columns)
+            (dense, dense_hours), dense_ms = timed(
+                lambda: predict_future_efficiency(*args, future_steps=max_steps), repeat)
+            (values, hours), adaptive_ms = timed(
+                lambda: predict_until_threshold(*args, threshold=threshold, max_steps=max_steps), repeat)
+            row = {
+                "case": name,
+                "threshold": threshold,
+                "dense_evaluations": max_steps,
+                "adaptive_evaluations": len(values),
+                "dense_ms": dense_ms,
+                "adaptive_ms": adaptive_ms,
+                "dense_hora_cambio": first_crossing(dense, dense_hours, threshold),
+                "adaptive_hora_cambio": first_crossing(values, hours, threshold),
+            }
+            results.append(row)
+            print(json.dumps(row))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, nargs="+", default=[50, 100, 250, 500, 1000])
+    parser.add_argument("--reference-max-steps", type=int, default=500,
+                        help="skip the slow per-step loop above this horizon")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fleet", type=int, nargs="+",
+                        help="fleet sizes to time as one batched rollout (uses the first --steps value)")
+    parser.add_argument("--adaptive", type=float, nargs="+", metavar="THRESHOLD",
+                        help="compare the adaptive horizon at these thresholds")
+    parser.add_argument("--max-steps", type=int, default=5000, help="horizon of the --adaptive comparison")
+    args = parser.parse_args()
+    if args.adaptive:
+        adaptive(args.adaptive, args.max_steps, args.repeat)
+    elif args.fleet:
+        fleet(args.fleet, args.steps[0], args.repeat)
+    else:
+        main(args.steps, args.reference_max_steps, args.repeat)
@@ -0,0 +1,108 @@
+"""
+Query latency of the API's sensor_data queries against collection size.
+
+For each size, fills three scratch collections with synthetic readings:
+
+  plain       - regular collection, no secondary indexes (the old layout)
+  indexed     - regular collection with the indexes from app/core/db.py
+  timeseries  - time-series collection with the same indexes
+
+and times the queries behind /api/data/, /api/data/source/{source} and the
+oldest-reading lookup. Needs a MongoDB at MONGO_URL; the scratch database is
+dropped at the end.
+
+Usage (from backend/):
+    python -m benchmarks.query_latency --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import MONGO_URL
+from app.core.db import SENSOR_DATA_INDEXES, TIMESERIES_OPTIONS
+
+SCRATCH_DB = "water_filter_bench"
+
+
+def make_documents(n, devices=50):
+    start = datetime(2025, 1, 1)
+    for i in range(n):
+        yield {
+            "timestamp": start + timedelta(seconds=2.5 * i),
+            "device_id": f"filter-{i % devices}",
+            "source": "entrada" if i % 2 else "salida",
+            "in_ph": random.uniform(6.5, 8.5),
+            "out_ph": random.uniform(6.5, 8.0),
+            "eficiencia": random.uniform(60, 100),
+        }
+
+
+async def fill(collection, n, batch_size=10000):
+    batch = []
+    for doc in make_documents(n):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+
+async def time_query(query, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await query()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+async def measure(collection, repeat):
+    return {
+        "latest_100_ms": await time_query(
+            lambda: collection.find().sort("timestamp", -1).limit(100).to_list(length=100), repeat),
+        "latest_100_by_source_ms": await time_query(
+            lambda: collection.find({"source": "entrada"}).sort("timestamp", -1).limit(100).to_list(length=100),
+            repeat),
+        "oldest_reading_ms": await time_query(
+            lambda: collection.find_one(sort=[("timestamp", 1)]), repeat),
+    }
+
+
+async def main(sizes, repeat):
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[SCRATCH_DB]
+    results = []
+
+    for size in sizes:
+        await client.drop_database(SCRATCH_DB)
+        await db.create_collection("timeseries", timeseries=TIMESERIES_OPTIONS)
+        for name in ("plain", "indexed", "timeseries"):
+            if name != "plain":
+                for keys in SENSOR_DATA_INDEXES:
+                    await db[name].create_index(keys)
+            await fill(db[name], size)
+
+        row = {"documents": size}
+        for name in ("plain", "indexed", "timeseries"):
+            row[name] = await measure(db[name], repeat)
+        results.append(row)
+        print(json.dumps(row))
+
+    await client.drop_database(SCRATCH_DB)
+    client.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.repeat))
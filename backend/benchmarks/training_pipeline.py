@@ -0,0 +1,143 @@
+"""
+Training input pipeline: memory and throughput against history length.
+
+- sequences: the old list-of-copies create_sequences vs the strided views
+  in app/lm/train.py (time and peak traced memory)
+- stream: one pass of sequence_batches over a synthetic history generated
+  chunk by chunk (samples/sec and peak traced memory, which should stay flat)
+- fit: one epoch of model.fit on make_dataset (samples/sec, needs TensorFlow)
+
+Usage (from backend/):
+    python -m benchmarks.training_pipeline --rows 10000 100000 1000000 --fit-rows 20000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from app.lm.train import create_sequences, sequence_batches, make_dataset, build_lstm_model
+
+FEATURES = [
+    'in_ph', 'in_color', 'in_turbidity', 'in_conductivity',
+    'out_ph', 'out_color', 'out_turbidity', 'out_conductivity',
+    'filter_operating_hours',
+]
+
+
+def list_sequences(X, y, seq_length):
+    """
+    The create_sequences train.py and test.py used before.
+    """
+    Xs, ys = [], []
+    for i in range(len(X) - seq_length):
+        Xs.append(X[i:i + seq_length])
+        ys.append(y[i + seq_length])
+    return np.array(Xs), np.array(ys)
+
+
+def synthetic_chunks(rows, chunk_rows=50_000, devices=4, seed=0):
+    """
+    (device_id, DataFrame) chunks of a simulate_data-like history, generated lazily.
+    """
+    rng = np.random.default_rng(seed)
+    per_device = rows // devices
+    for device in range(devices):
+        for start in range(0, per_device, chunk_rows):
+            n = min(chunk_rows, per_device - start)
+            hours = np.arange(start, start + n, dtype=np.float64)
+            df = pd.DataFrame({name: rng.uniform(0, 1, n) for name in FEATURES[:-1]})
+            df['filter_operating_hours'] = hours
+            df['eficiencia'] = np.clip(100 - hours * 0.1 / (per_device / 300) + rng.normal(0, 1.5, n), 0, 100)
+            yield f"device-{device}", df
+
+
+def fitted_scalers(rows):
+    scaler_X, scaler_y = MinMaxScaler(), MinMaxScaler()
+    for _, chunk in synthetic_chunks(rows):
+        scaler_X.partial_fit(chunk[FEATURES])
+        scaler_y.partial_fit(chunk[['eficiencia']])
+    return scaler_X, scaler_y
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, round(peak / 2**20, 1)
+
+
+def bench_sequences(rows, seq_len, list_max_rows):
+    X = np.random.rand(rows, len(FEATURES))
+    y = np.random.rand(rows, 1)
+    row = {"bench": "sequences", "rows": rows}
+    _, elapsed, peak = measure(lambda: create_sequences(X, y, seq_len))
+    row.update(view_ms=round(elapsed * 1000, 2), view_peak_mb=peak)
+    if rows <= list_max_rows:
+        _, elapsed, peak = measure(lambda: list_sequences(X, y, seq_len))
+        row.update(list_ms=round(elapsed * 1000, 2), list_peak_mb=peak)
+    return row
+
+
+def bench_stream(rows, seq_len, batch_size):
+    scaler_X, scaler_y = fitted_scalers(rows)
+
+    def consume():
+        samples = 0
+        for X_batch, _ in sequence_batches(synthetic_chunks(rows), scaler_X, scaler_y, FEATURES,
+                                           seq_len, batch_size):
+            samples += len(X_batch)
+        return samples
+
+    samples, elapsed, peak = measure(consume)
+    return {"bench": "stream", "rows": rows, "samples": samples,
+            "samples_per_sec": round(samples / elapsed), "peak_mb": peak}
+
+
+def bench_fit(rows, seq_len, batch_size):
+    scaler_X, scaler_y = fitted_scalers(rows)
+    steps = sum(1 for _ in sequence_batches(synthetic_chunks(rows), scaler_X, scaler_y, FEATURES, seq_len, batch_size))
+    dataset = make_dataset(lambda: synthetic_chunks(rows), scaler_X, scaler_y, FEATURES, seq_len, batch_size,
+                           steps=steps)
+    model = build_lstm_model(seq_len, len(FEATURES))
+    # First epoch includes graph tracing
+    model.fit(dataset.take(10), epochs=1, verbose=0, shuffle=False)
+
+    start = time.perf_counter()
+    model.fit(dataset, epochs=1, verbose=0, shuffle=False)
+    elapsed = time.perf_counter() - start
+    samples = rows - 4 * seq_len
+    return {"bench": "fit", "rows": rows, "batch_size": batch_size,
+            "samples_per_sec": round(samples / elapsed)}
+
+
+def main(rows_list, fit_rows, seq_len, batch_size, list_max_rows):
+    results = []
+    for rows in rows_list:
+        results.append(bench_sequences(rows, seq_len, list_max_rows))
+        print(json.dumps(results[-1]))
+    for rows in rows_list:
+        results.append(bench_stream(rows, seq_len, batch_size))
+        print(json.dumps(results[-1]))
+    if fit_rows:
+        results.append(bench_fit(fit_rows, seq_len, batch_size))
+        print(json.dumps(results[-1]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--fit-rows", type=int, default=20_000, help="0 skips the model.fit benchmark")
+    parser.add_argument("--seq-len", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--list-max-rows", type=int, default=1_000_000,
+                        help="skip the list-based create_sequences above this size")
+    args = parser.parse_args()
+    main(args.rows, args.fit_rows, args.seq_len, args.batch_size, args.list_max_rows)
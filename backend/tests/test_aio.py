@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from app.mqtt.aio import AsyncioMqttClient
+
+CONNACK = bytes([0x20, 0x02, 0x00, 0x00])
+
+
+async def _broker(reader, writer):
+    # Accept any CONNECT, then ignore the rest (SUBSCRIBE, pings)
+    await reader.read(1024)
+    writer.write(CONNACK)
+    await writer.drain()
+    await reader.read()
+
+
+def test_connects_over_its_own_socket():
+    async def main():
+        server = await asyncio.start_server(_broker, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        connected = asyncio.Event()
+        client = AsyncioMqttClient("localhost", port, "sensores/#", lambda *a: None, max_retries=1)
+        client.client.on_connect = lambda *a: connected.set()
+        await client.start()
+        await asyncio.wait_for(connected.wait(), 2)
+        await client.stop()
+        server.close()
+
+    asyncio.run(main())
+
+
+def test_unresponsive_broker_does_not_block_the_loop(monkeypatch):
+    async def main():
+        loop = asyncio.get_running_loop()
+
+        async def never_connects(sock, address):
+            await asyncio.Event().wait()
+
+        monkeypatch.setattr(loop, "sock_connect", never_connects)
+        client = AsyncioMqttClient("127.0.0.1", 1883, "sensores/#", lambda *a: None,
+                                   max_retries=1, connect_timeout=0.3)
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = loop.create_task(ticker())
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            await client.start()
+        elapsed = time.perf_counter() - start
+        task.cancel()
+        assert 0.3 <= elapsed < 1
+        # The loop kept running while the connection attempt was pending
+        assert ticks >= 15
+
+    asyncio.run(main())
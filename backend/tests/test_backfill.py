@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.core.backfill import Backfill
+
+
+class _Database(dict):
+    def __missing__(self, name):
+        return None
+
+
+def _backfill():
+    backfill = Backfill(_Database(), rollups=False)
+    backfill.installed_at = {"filtro-1": datetime(2026, 1, 2)}
+    return backfill
+
+
+def _readings(hours):
+    return pd.DataFrame({
+        "device_id": "filtro-1",
+        "timestamp": pd.to_datetime(["2026-01-01 12:00", "2026-01-03 00:00", "2026-01-04 00:00"]),
+        "in_ph": 7.0, "out_ph": 7.2, "eficiencia": 95.0,
+        "filter_operating_hours": hours,
+    })
+
+
+def test_file_operating_hours_are_kept():
+    backfill = _backfill()
+    df = backfill._derive(_readings([500.0, 536.0, np.nan]))
+    # Only the missing value is derived from the installation time
+    assert df["filter_operating_hours"].tolist() == [500.0, 536.0, 48.0]
+    assert backfill.before_install == 0
+
+
+def test_derived_rows_before_installation_are_skipped():
+    backfill = _backfill()
+    df = backfill._derive(_readings(np.nan).drop(columns="filter_operating_hours"))
+    assert df["timestamp"].tolist() == [pd.Timestamp("2026-01-03"), pd.Timestamp("2026-01-04")]
+    assert df["filter_operating_hours"].tolist() == [24.0, 48.0]
+    assert backfill.before_install == 1
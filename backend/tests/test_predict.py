@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from app.lm.numpy_lstm import NumpyScaler
+from app.lm.predict import predict_future_efficiency, predict_future_efficiency_batch, predict_until_threshold
+
+FEATURES = ["in_ph", "filter_operating_hours"]
+
+
+class _HourModel:
+    """
+    Predicts 1 - the scaled operating hours of the window's last row. With the
+    scaler_y below that is 3000 - hours, and as step k's window ends at the
+    last reading plus k - 1 hours, 3001 - the projected hour.
+    """
+
+    def predict_on_batch(self, x):
+        return 1 - x[:, -1, 1:2]
+
+
+def _fleet_case():
+    # Hours of a fleet far from the 0-299 range of the simulated data
+    hours = np.linspace(1000, 3000, 201)
+    train = pd.DataFrame({"in_ph": np.full(len(hours), 7.0), "filter_operating_hours": hours})
+    scaler_X = MinMaxScaler().fit(train[FEATURES])
+    scaler_y = MinMaxScaler().fit([[0.0], [2000.0]])
+    df_case = train[train["filter_operating_hours"] <= 2000].tail(20).assign(eficiencia=0.0)
+    return df_case, scaler_X, scaler_y
+
+
+def test_each_step_is_one_operating_hour():
+    df_case, scaler_X, scaler_y = _fleet_case()
+    args = (_HourModel(), df_case, scaler_X, scaler_y, FEATURES)
+
+    eficiencia, horas = predict_future_efficiency(*args, future_steps=50)
+    np.testing.assert_array_equal(horas, np.arange(2001, 2051))
+    np.testing.assert_allclose(eficiencia, 3001 - horas, atol=1e-3)
+
+    projections = predict_future_efficiency_batch(args[0], {"a": df_case}, scaler_X, scaler_y, FEATURES, future_steps=50)
+    np.testing.assert_allclose(projections["a"][0], eficiencia, atol=1e-6)
+
+    eficiencia, horas = predict_until_threshold(*args, threshold=900, max_steps=1000)
+    crossing = horas[np.argmax(eficiencia < 900)]
+    assert crossing == 2102
+
+
+def test_numpy_scaler_gives_the_same_step():
+    df_case, scaler_X, scaler_y = _fleet_case()
+    exported_X = NumpyScaler(scaler_X.min_, scaler_X.scale_)
+    exported_y = NumpyScaler(scaler_y.min_, scaler_y.scale_)
+
+    eficiencia, horas = predict_future_efficiency(_HourModel(), df_case, exported_X, exported_y, FEATURES, future_steps=50)
+    np.testing.assert_allclose(eficiencia, 3001 - horas, atol=1e-3)
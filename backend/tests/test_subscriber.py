@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime
+
+from app.lm.projection_cache import ProjectionCache
+from app.mqtt import subscriber
+from app.mqtt.filter_state import FilterState, FilterStateCache
+from app.mqtt.stats import LiveStats
+
+
+class _Writer:
+    def __init__(self):
+        self.documents = []
+
+    async def put(self, document):
+        self.documents.append(document)
+
+
+class _Manager:
+    async def broadcast(self, data):
+        pass
+
+
+def test_utc_offset_timestamp_is_stored_naive(monkeypatch):
+    # State as reloaded from MongoDB after a restart: naive datetimes
+    states = FilterStateCache(collection=None)
+    states.states["filter-01"] = FilterState("filter-01", datetime(2026, 1, 1))
+    writer = _Writer()
+    monkeypatch.setattr(subscriber, "filter_states", states)
+    monkeypatch.setattr(subscriber, "ingest_writer", writer)
+    monkeypatch.setattr(subscriber, "manager", _Manager())
+
+    payload = {"device_id": "filter-01", "timestamp": "2026-01-02T10:00:00Z", "in_ph": 7.1, "out_ph": 7.2}
+    asyncio.run(subscriber.process_and_save(dict(payload)))
+    asyncio.run(subscriber.process_and_save({**payload, "timestamp": "2026-01-02T13:00:00+02:00"}))
+
+    first, second = writer.documents
+    assert first["timestamp"] == datetime(2026, 1, 2, 10)
+    assert second["timestamp"] == datetime(2026, 1, 2, 11)
+    assert first["filter_operating_hours"] == 34.0
+    assert second["filter_operating_hours"] == 35.0
+
+    # A flush mixing them with a naive reading moves every watermark
+    batch = writer.documents + [{"device_id": "filter-01", "timestamp": datetime(2026, 1, 2, 9)}]
+    stats = LiveStats(collection=None)
+    cache = ProjectionCache()
+    asyncio.run(stats.on_flush(batch))
+    asyncio.run(cache.on_flush(batch))
+    assert stats.latest_timestamp == datetime(2026, 1, 2, 11)
+    assert cache.watermark("filter-01") == datetime(2026, 1, 2, 11)
@@ -0,0 +1,18 @@
+import pytest
+
+from app.websockets.manager import ClientConnection, ConnectionManager
+
+
+@pytest.mark.parametrize("devices", ["filter-01", ["filter-01", 1], {"id": "filter-01"}])
+def test_subscribe_rejects_devices_that_are_not_a_list_of_strings(devices):
+    manager = ConnectionManager()
+    websocket = object()
+    manager.active_connections[websocket] = ClientConnection(websocket, 10)
+
+    with pytest.raises(ValueError):
+        manager.subscribe(websocket, devices=devices)
+    with pytest.raises(ValueError):
+        manager.unsubscribe(websocket, devices=devices)
+    # Still subscribed to everything, nothing added to the topic index
+    assert manager.device_subscribers == {}
+    assert manager.subscribe(websocket, devices=["filter-01"])["devices"] == ["filter-01"]
@@ -2,15 +2,45 @@ import time
 import json
 import random
 import os
+import csv
+import heapq
 import paho.mqtt.client as mqtt
 import signal
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 # Configuration
 MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST", "127.0.0.1")
 MQTT_BROKER_PORT = int(os.getenv("MQTT_BROKER_PORT", 1883))
 PUBLISH_INTERVAL = float(os.getenv("PUBLISH_INTERVAL", 2.5))  # Default to 2.5 seconds
+# "json" (default) or "msgpack" for the compact encoding published on sensores/mp
+PAYLOAD_ENCODING = os.getenv("PAYLOAD_ENCODING", "json")
+
+# "single" (default): one device on sensores/data
+# "fleet": DEVICES devices on sensores/<device>/data, each with its own drift
+# "replay": publish REPLAY_FILE (dataset CSV or exported CSV/NDJSON history)
+#           REPLAY_SPEEDUP times faster than real time
+EMULATOR_MODE = os.getenv("EMULATOR_MODE", "single")
+DEVICES = int(os.getenv("DEVICES", 1000))
+DEVICE_PREFIX = os.getenv("DEVICE_PREFIX", "filter")
+REPLAY_FILE = os.getenv("REPLAY_FILE", "dataset_30dias_8horas.csv")
+REPLAY_SPEEDUP = float(os.getenv("REPLAY_SPEEDUP", 3600))  # simulated seconds per real second
+REPLAY_DEVICES = int(os.getenv("REPLAY_DEVICES", 1))
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", 10))  # seconds between rate reports
+
+# Compact field IDs - must match FIELD_IDS in backend/app/core/codec.py
+FIELD_IDS = {
+    "timestamp": 0,
+    "device_id": 1,
+    "in_ph": 2,
+    "in_conductivity": 3,
+    "in_turbidity": 4,
+    "in_color": 5,
+    "out_ph": 6,
+    "out_conductivity": 7,
+    "out_turbidity": 8,
+    "out_color": 9,
+}
 
 # Initial values - consolidated into a single structure
 current_values = {
@@ -93,6 +123,166 @@ def generate_sensor_data():
     
     return data
 
+def encode_payload(data, device_id=None):
+    """
+    Return (topic, payload) for the configured encoding; per-device topics when device_id is given
+    """
+    base = f"sensores/{device_id}" if device_id else "sensores"
+    if PAYLOAD_ENCODING == "msgpack":
+        import msgpack
+        compact = {FIELD_IDS.get(k, k): v for k, v in data.items()}
+        # Epoch seconds instead of the ISO string; naive timestamps are taken as UTC,
+        # the way the backend decodes them
+        timestamp = datetime.fromisoformat(data["timestamp"])
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        compact[FIELD_IDS["timestamp"]] = timestamp.timestamp()
+        return f"{base}/mp", msgpack.packb(compact, use_bin_type=True)
+    return f"{base}/data", json.dumps(data)
+
+class Device:
+    """
+    One emulated filter with its own random generator and drifting values
+    """
+
+    def __init__(self, device_id, seed):
+        self.device_id = device_id
+        self.rng = random.Random(seed)
+        # Start every device somewhere else inside the normal range
+        self.values = {
+            param: value + self.rng.uniform(-5, 5) * variance[param]
+            for param, value in current_values.items()
+        }
+
+    def generate(self, timestamp):
+        for param, value in self.values.items():
+            min_val, max_val = bounds[param]
+            value += self.rng.uniform(-variance[param], variance[param])
+            self.values[param] = max(min_val, min(value, max_val))
+
+        v = self.values
+        return {
+            "timestamp": timestamp.isoformat(),
+            "in_ph": round(v["in_ph"], 2),
+            "in_conductivity": int(v["in_conductivity"]),
+            "in_turbidity": round(v["in_turbidity"], 2),
+            "in_color": round(v["in_color"], 2),
+            "out_ph": round(v["out_ph"], 2),
+            "out_conductivity": int(v["out_conductivity"]),
+            "out_turbidity": round(v["out_turbidity"], 2),
+            "out_color": round(v["out_color"], 2)
+        }
+
+def fleet_streams(n_devices, interval):
+    """
+    One endless stream per device: (seconds from start, device_id, data factory).
+    Start times are spread over one interval so the load is even.
+    """
+    for i in range(n_devices):
+        device = Device(f"{DEVICE_PREFIX}-{i:04d}", seed=i)
+
+        def stream(device=device, phase=interval * i / n_devices):
+            k = 0
+            while True:
+                yield phase + k * interval, device.device_id, lambda: device.generate(datetime.now())
+                k += 1
+
+        yield stream()
+
+# Dataset CSV names -> names used by the backend
+REPLAY_COLUMNS = {
+    "in_turbidez": "in_turbidity",
+    "out_turbidez": "out_turbidity",
+    "in_conductividad": "in_conductivity",
+    "out_conductividad": "out_conductivity",
+}
+SENSOR_FIELDS = list(current_values)
+
+def read_history(path):
+    """
+    Rows of a dataset CSV or of a CSV/NDJSON export, with backend field names
+    """
+    with open(path, newline="") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    return [{REPLAY_COLUMNS.get(k, k): v for k, v in row.items()} for row in rows]
+
+def replay_offsets(rows):
+    """
+    Simulated hours since the first row: the operating hour column of the
+    dataset CSV, or the timestamps of an export
+    """
+    if rows and "filter_operating_hour" in rows[0]:
+        return [float(row["filter_operating_hour"]) for row in rows]
+    times = [datetime.fromisoformat(str(row["timestamp"]).replace("Z", "")) for row in rows]
+    return [(t - times[0]).total_seconds() / 3600 for t in times]
+
+def replay_streams(path, speedup, n_devices):
+    rows = read_history(path)
+    hours = replay_offsets(rows)
+    sim_start = datetime.now()
+    print(f"Replaying {len(rows)} rows ({hours[-1] - hours[0]:.0f} simulated hours) "
+          f"in {(hours[-1] - hours[0]) * 3600 / speedup:.0f} s on {n_devices} device(s)")
+
+    for i in range(n_devices):
+        device_id = f"{DEVICE_PREFIX}-replay-{i:04d}"
+
+        def stream(device_id=device_id):
+            for row, hour in zip(rows, hours):
+                # Timestamps advance in simulated time, so the backend sees the operating hours of the dataset
+                timestamp = sim_start + timedelta(hours=hour)
+                data = {"timestamp": timestamp.isoformat()}
+                data.update({field: float(row[field]) for field in SENSOR_FIELDS if row.get(field) not in (None, "")})
+                yield (hour - hours[0]) * 3600 / speedup, device_id, lambda data=data: data
+
+        yield stream()
+
+def run_schedule(streams):
+    """
+    Publish the merged streams at their scheduled times.
+
+    Send times are fixed offsets from the start, so a slow iteration is
+    caught up instead of pushing every later message back. publish() only
+    queues the message for paho's network thread.
+    """
+    heap = []
+    for index, stream in enumerate(streams):
+        first = next(stream, None)
+        if first is not None:
+            heap.append((first[0], index, first, stream))
+    heapq.heapify(heap)
+
+    start = time.monotonic()
+    published = 0
+    window_start, window_published, max_lag = start, 0, 0.0
+    while heap:
+        offset, index, (_, device_id, make_data), stream = heap[0]
+        now = time.monotonic()
+        wait = start + offset - now
+        if wait > 0:
+            time.sleep(min(wait, 0.05))
+            continue
+
+        max_lag = max(max_lag, -wait)
+        client.publish(*encode_payload(make_data(), device_id))
+        published += 1
+        window_published += 1
+
+        following = next(stream, None)
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (following[0], index, following, stream))
+
+        if now - window_start >= STATS_INTERVAL:
+            print(f"Published {published} messages, {window_published / (now - window_start):.0f} msg/s, "
+                  f"max schedule lag {max_lag * 1000:.0f} ms")
+            window_start, window_published, max_lag = now, 0, 0.0
+
+    print(f"Done: {published} messages in {time.monotonic() - start:.1f} s")
+
 # Handle graceful shutdown
 def signal_handler(sig, frame):
     print("Shutting down sensor simulator...")
@@ -108,6 +298,17 @@ def run_simulator():
         print("Exiting due to MQTT connection failure")
         return
     
+    if EMULATOR_MODE == "fleet":
+        print(f"Fleet simulator: {DEVICES} devices, one reading each every {PUBLISH_INTERVAL} seconds "
+              f"({DEVICES / PUBLISH_INTERVAL:.0f} msg/s)")
+        run_schedule(fleet_streams(DEVICES, PUBLISH_INTERVAL))
+        return
+    if EMULATOR_MODE == "replay":
+        run_schedule(replay_streams(REPLAY_FILE, REPLAY_SPEEDUP, REPLAY_DEVICES))
+        client.loop_stop()
+        client.disconnect()
+        return
+
     print(f"Sensor simulator running. Publishing data every {PUBLISH_INTERVAL} seconds...")
     print("Press Ctrl+C to stop")
     
@@ -115,7 +316,7 @@ def run_simulator():
         while True:
             # Generate and publish consolidated data
             data = generate_sensor_data()
-            client.publish("sensores/data", json.dumps(data))
+            client.publish(*encode_payload(data))
             
             print(f"Published data: pH in={data['in_ph']}, pH out={data['out_ph']}, " 
                   f"Conductivity in={data['in_conductivity']}, Conductivity out={data['out_conductivity']}")